@@ -3,11 +3,24 @@ import os
 import pandas as pd
 import numpy as np
 import time
+import argparse
+import bisect
+import hashlib
 import json
+import random
 import re
 import requests
+import sqlite3
+import threading
+import aiohttp
 import unicodedata
-from datetime import datetime, timedelta
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, partial
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
 
 # REMOVIDO: from google_spreadsheets.spreadsheet import GoogleSheetClient
 # ADICIONADO: Uso direto do gspread
@@ -17,6 +30,7 @@ import gspread
 # ⚠️ CONFIGURAÇÕES OBTIDAS DOS SEGREDOS (ENV VARS)
 # ==============================================================================
 ACCOUNT_ID = "3619571" 
+BASECAMP_API_BASE = os.getenv("BASECAMP_API_BASE", "https://3.basecampapi.com")
 
 # Segredos de Autenticação
 CLIENT_ID = os.getenv("BASECAMP_CLIENT_ID")
@@ -29,6 +43,14 @@ PALAVRAS_CHAVE_PROJETO = ["MEDIA PORTAL", "SPRINT"]
 TERMOS_DE_BUSCA_LISTAS = ["ATIVIDADES DA SEMANA", "BACKLOG"]
 LIMITE_LISTAS_RECENTES = 7
 LIMITE_TAREFAS_POR_LISTA = 0 
+MOTOR_CRAWL = os.getenv("MOTOR_CRAWL", "listas")  # "listas" (por lista/grupo) ou "recordings" (/projects/recordings.json em lote)
+
+# Vários destinos numa execução: JSON (ou caminho de um arquivo JSON) com a lista de alvos, ex.:
+# [{"nome": "time-a", "account_id": "3619571", "palavras_chave_projeto": ["SPRINT"],
+#   "termos_listas": ["ATIVIDADES DA SEMANA", "BACKLOG"], "planilha": "Planilha A", "pasta": "<FOLDER_ID>"}]
+# Campos omitidos usam as configurações acima; sem ALVOS_SINCRONIA, o alvo único é o delas.
+ALVOS_SINCRONIA = os.getenv("ALVOS_SINCRONIA", "")
+MAX_ALVOS_PARALELOS = int(os.getenv("MAX_ALVOS_PARALELOS", "4"))  # Planilhas publicadas ao mesmo tempo
 
 # Nomes das Abas
 NOME_ABA_EQUIPES = "Equipes"
@@ -38,40 +60,79 @@ NOME_ABA_HISTORICO = "HistoricoDiario"
 NOME_ABA_BACKLOG = "Backlog"
 MAX_RETRIES = 5
 
+# --- CONCORRÊNCIA DO CRAWL ---
+MAX_CONCORRENCIA = int(os.getenv("MAX_CONCORRENCIA", "8"))                  # Requisições simultâneas (global)
+MAX_CONCORRENCIA_POR_HOST = int(os.getenv("MAX_CONCORRENCIA_POR_HOST", "4"))  # Requisições simultâneas por host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", str(MAX_CONCORRENCIA)))     # Conexões keep-alive mantidas abertas
+HTTP_TIMEOUT = 60
+
+# --- RETRY / RATE LIMIT (Basecamp: 50 requisições a cada 10s por IP) ---
+BASECAMP_LIMITE_REQUISICOES = int(os.getenv("BASECAMP_LIMITE_REQUISICOES", "50"))
+BASECAMP_JANELA_SEGUNDOS = 10
+BACKOFF_BASE = 0.5   # segundos
+BACKOFF_MAXIMO = 30  # segundos
+
+# --- PAGINAÇÃO E CACHE CONDICIONAL ---
+MODO_PAGINACAO = os.getenv("MODO_PAGINACAO", "link")  # "link" (segue Link rel="next") ou "pagina" (page=1,2,3...)
+CACHE_HTTP_ARQUIVO = os.getenv("CACHE_HTTP_ARQUIVO", ".cache/basecamp_http.json")
+ESTADO_SINCRONIA_ARQUIVO = os.getenv("ESTADO_SINCRONIA_ARQUIVO", ".cache/sincronia.sqlite3")
+CONSOLIDACAO_ARQUIVO = os.getenv("CONSOLIDACAO_ARQUIVO", ".cache/consolidacao.json")
+EQUIPES_CACHE_ARQUIVO = os.getenv("EQUIPES_CACHE_ARQUIVO", ".cache/equipes.json")
+
+# --- SNAPSHOTS ENTRE ETAPAS (extract -> transform -> publish) ---
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_EXTRACAO = os.path.join(SNAPSHOT_DIR, "extracao.parquet")
+SNAPSHOT_TRATADO = os.path.join(SNAPSHOT_DIR, "tratado.parquet")
+
+# --- TOKEN DO BASECAMP ---
+BASECAMP_TOKEN_URL = os.getenv("BASECAMP_TOKEN_URL", "https://launchpad.37signals.com/authorization/token")
+TOKEN_CACHE_ARQUIVO = os.getenv("TOKEN_CACHE_ARQUIVO", "")  # vazio: token só em memória; nunca dentro de .cache (vai para o cache do Actions)
+TOKEN_CACHE_LEGADO = ".cache/basecamp_token.json"  # onde versões anteriores guardavam o token; só para a migração em CredencialBasecamp.obter
+TOKEN_MARGEM_RENOVACAO = 300  # segundos antes de expirar em que o token já é renovado
+TOKEN_VALIDADE_PADRAO = 1209600  # 2 semanas, se o launchpad não informar expires_in
+
+# --- RELATÓRIO DE EXECUÇÃO ---
+RELATORIO_EXECUCAO = os.getenv("RELATORIO_EXECUCAO", "relatorios/relatorio_execucao.json")
+PROMETHEUS_TEXTFILE = os.getenv("PROMETHEUS_TEXTFILE")  # opcional, ex.: /var/lib/node_exporter/basecamp_sync.prom
+
 MESES_NUM_PT = {
     1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril', 5: 'Maio', 6: 'Junho',
     7: 'Julho', 8: 'Agosto', 9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
 }
 MESES_PT_NUM = {v: k for k, v in MESES_NUM_PT.items()} 
 
-def a_second():
-    time.sleep(0.05) 
-    return True
-
 # --- PREPARAÇÃO DO AMBIENTE CLOUD ---
-def configurar_google_credentials():
-    """Recria o arquivo json do Google a partir do Segredo"""
-    conteudo_json = os.getenv("GCP_CREDENTIALS_JSON")
-    caminho_arquivo = "google_credentials.json"
-    
-    if conteudo_json:
-        print(">>> Configurando credenciais Google...")
-        with open(caminho_arquivo, "w") as f:
-            f.write(conteudo_json)
-    else:
-        print("⚠️ AVISO: Segredo GCP_CREDENTIALS_JSON não encontrado.")
-
 def conectar_google_sheets():
-    """Conecta no Google Sheets usando o arquivo JSON criado"""
+    """Conecta no Google Sheets direto do JSON do Segredo, sem gravá-lo em disco"""
+    conteudo_json = os.getenv("GCP_CREDENTIALS_JSON")
     try:
-        # Usa o gspread nativo para autenticar com o arquivo json
-        gc = gspread.service_account(filename="google_credentials.json")
-        return gc
+        if conteudo_json:
+            print(">>> Configurando credenciais Google...")
+            return gspread.service_account_from_dict(json.loads(conteudo_json))
+        # Execução local: arquivo baixado do console do Google Cloud
+        print("⚠️ AVISO: Segredo GCP_CREDENTIALS_JSON não encontrado; usando google_credentials.json.")
+        return gspread.service_account(filename="google_credentials.json")
     except Exception as e:
         print(f"❌ Erro ao conectar no Google Sheets: {e}")
         return None
 
 # --- FUNÇÕES AUXILIARES ---
+def _criar_pasta(caminho):
+    pasta = os.path.dirname(caminho)
+    if pasta: os.makedirs(pasta, exist_ok=True)
+
+def _ler_json(caminho):
+    """Conteúdo do arquivo JSON, ou None se ele não existir ou estiver corrompido."""
+    try:
+        with open(caminho, "r", encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+def _gravar_json(caminho, dados, modo=None, **opcoes):
+    """Grava `dados` em JSON criando a pasta; com `modo`, um arquivo novo nasce com essas permissões."""
+    _criar_pasta(caminho)
+    arquivo = caminho if modo is None else os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, modo)
+    with open(arquivo, "w", encoding="utf-8") as f: json.dump(dados, f, **opcoes)
+
 def normalizar_texto(texto):
     if not isinstance(texto, str): return ""
     return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn').upper().strip()
@@ -101,6 +162,39 @@ def encontrar_encarregado(sub_lista_val, df_equipes):
                 return nome_real
     return ""
 
+def _chave_busca_encarregado(sub_lista_val):
+    """(primeiro nome, prefixo de 4 letras do sobrenome) de um 'Sub-Lista / Grupo'; None se vazio."""
+    val_limpo = normalizar_texto(sub_lista_val).replace("ATIVIDADES", "").strip()
+    if not val_limpo: return None
+    partes_busca = val_limpo.split()
+    return partes_busca[0], (partes_busca[1][:4] if len(partes_busca) > 1 else "")
+
+def indexar_equipes(df_equipes):
+    """(primeiro nome, 4 letras do sobrenome) -> nome e primeiro nome -> nome, como em encontrar_encarregado; None sem equipe."""
+    if df_equipes.empty: return None
+    por_nome_sobrenome = {}; por_nome = {}
+    for nome_real in df_equipes['Nome']:
+        partes_real = normalizar_texto(nome_real).split()
+        if not partes_real: continue
+        por_nome.setdefault(partes_real[0], nome_real)
+        if len(partes_real) > 1:
+            por_nome_sobrenome.setdefault((partes_real[0], partes_real[1][:4]), nome_real)
+    return por_nome_sobrenome, por_nome
+
+def atribuir_encarregados(serie_sub_lista, indice_equipes):
+    """Resolve cada valor único de 'Sub-Lista / Grupo' uma vez no índice e mapeia de volta na série."""
+    por_nome_sobrenome, por_nome = indice_equipes
+    codigos, unicos = pd.factorize(serie_sub_lista)  # NaN vira código -1
+    resolvidos = []
+    for valor in unicos:
+        chave = _chave_busca_encarregado(valor)
+        if chave is None: resolvidos.append("")
+        elif chave[1]: resolvidos.append(por_nome_sobrenome.get(chave, ""))
+        else: resolvidos.append(por_nome.get(chave[0], ""))
+    resolvidos.append("")  # posição -1: valores nulos
+    return pd.Series(np.array(resolvidos, dtype=object)[codigos], index=serie_sub_lista.index)
+
+@lru_cache(maxsize=None)  # o crawl (ordenação das listas) e o tratamento consultam os mesmos títulos
 def extrair_data_da_lista_dt(texto_lista):
     try:
         match = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', str(texto_lista))
@@ -109,6 +203,12 @@ def extrair_data_da_lista_dt(texto_lista):
     except: pass
     return pd.NaT
 
+def datas_das_listas(serie_titulos):
+    """extrair_data_da_lista_dt aplicado uma vez por título distinto e mapeado de volta na série."""
+    codigos, unicos = pd.factorize(serie_titulos)  # NaN vira código -1
+    datas = pd.DatetimeIndex([extrair_data_da_lista_dt(t) for t in unicos] + [pd.NaT])
+    return pd.Series(datas[codigos], index=serie_titulos.index)
+
 def converter_data_segura(series):
     series = series.astype(str).str.strip()
     series = series.replace(['nan', 'None', '', 'NaT', '0', '#N/A'], np.nan)
@@ -125,14 +225,126 @@ def extrair_mes_ano_do_nome_aba(nome_aba):
     except: pass
     return None
 
+# --- INSTRUMENTAÇÃO ---
+def familia_endpoint(url):
+    """Agrupa URLs por tipo de recurso: '/buckets/1/todolists/2/todos.json?page=3' -> 'todos'."""
+    partes = [p for p in urlparse(url).path.split("/") if p]
+    if not partes: return "outros"
+    ultimo = partes[-1].replace(".json", "")
+    if ultimo.isdigit(): return (partes[-2] if len(partes) > 1 else "outros").rstrip("s")
+    return ultimo
+
+def _escapar_rotulo(valor):
+    """Valor de rótulo no formato texto do Prometheus: escapa \\, " e quebra de linha."""
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metricas:
+    """Tempo por etapa, HTTP por família de endpoint, linhas escritas por aba e erros da execução."""
+    def __init__(self):
+        self.inicio = datetime.now(timezone.utc)
+        self.etapas = {}
+        self.http = {}
+        self.abas = {}
+        self.erros = []
+        self.urls_com_falha = []
+        self.cache_http = 0
+        self.cache_estado = 0
+        self._local = threading.local()
+
+    def _com_alvo(self, nome):
+        # Publicações de alvos diferentes rodam em threads próprias e têm abas de mesmo nome
+        alvo = getattr(self._local, "alvo", None)
+        return f"{alvo}/{nome}" if alvo else nome
+
+    @contextmanager
+    def alvo(self, nome):
+        """Prefixa com o nome do alvo as etapas, abas e erros registrados nesta thread."""
+        self._local.alvo = nome
+        try: yield
+        finally: self._local.alvo = None
+
+    @contextmanager
+    def etapa(self, nome):
+        nome = self._com_alvo(nome)
+        inicio = time.perf_counter()
+        try: yield
+        finally: self.etapas[nome] = self.etapas.get(nome, 0.0) + time.perf_counter() - inicio
+
+    def registrar_http(self, url, status_code, n_bytes, tentativa, duracao):
+        familia = self.http.setdefault(familia_endpoint(url), {"requisicoes": 0, "bytes": 0, "retries": 0, "segundos": 0.0, "status": {}})
+        familia["requisicoes"] += 1
+        familia["bytes"] += n_bytes
+        familia["segundos"] += duracao
+        if tentativa > 0: familia["retries"] += 1
+        chave = str(status_code) if status_code is not None else "erro"
+        familia["status"][chave] = familia["status"].get(chave, 0) + 1
+
+    def registrar_aba(self, nome_aba, linhas, alteradas=None, novas=None, removidas=None):
+        self.abas[self._com_alvo(nome_aba)] = {"linhas": linhas, "alteradas": alteradas, "novas": novas, "removidas": removidas}
+
+    def registrar_erro(self, etapa, erro):
+        self.erros.append({"etapa": self._com_alvo(etapa), "erro": f"{type(erro).__name__}: {erro}"})
+
+    def relatorio(self):
+        return {
+            "inicio": self.inicio.isoformat(),
+            "duracao_total_s": round((datetime.now(timezone.utc) - self.inicio).total_seconds(), 3),
+            "etapas_s": {k: round(v, 3) for k, v in self.etapas.items()},
+            "http": self.http,
+            "abas": self.abas,
+            "reaproveitados": {"http_304": self.cache_http, "listas_sem_mudanca": self.cache_estado},
+            "erros": self.erros,
+            "urls_com_falha": [{"url": u, "status": st} for u, st in self.urls_com_falha],
+        }
+
+    def _prometheus(self, rel):
+        linhas = []
+        def metrica(nome, tipo, ajuda, amostras):
+            linhas.append(f"# HELP basecamp_sync_{nome} {ajuda}")
+            linhas.append(f"# TYPE basecamp_sync_{nome} {tipo}")
+            for rotulos, valor in amostras:
+                txt = ",".join(f'{k}="{_escapar_rotulo(v)}"' for k, v in rotulos.items())
+                linhas.append(f"basecamp_sync_{nome}{{{txt}}} {valor}" if txt else f"basecamp_sync_{nome} {valor}")
+        metrica("duracao_segundos", "gauge", "Duração total da execução.", [({}, rel["duracao_total_s"])])
+        metrica("etapa_segundos", "gauge", "Tempo de parede por etapa.", [({"etapa": k}, v) for k, v in rel["etapas_s"].items()])
+        metrica("http_requisicoes", "gauge", "Requisições HTTP por família e status.",
+                [({"familia": f, "status": st}, n) for f, d in rel["http"].items() for st, n in d["status"].items()])
+        metrica("http_bytes", "gauge", "Bytes recebidos por família.", [({"familia": f}, d["bytes"]) for f, d in rel["http"].items()])
+        metrica("http_retries", "gauge", "Retentativas por família.", [({"familia": f}, d["retries"]) for f, d in rel["http"].items()])
+        metrica("linhas_escritas", "gauge", "Linhas publicadas por aba.", [({"aba": a}, d["linhas"]) for a, d in rel["abas"].items()])
+        metrica("erros", "gauge", "Erros capturados na execução.", [({}, len(rel["erros"]))])
+        metrica("urls_com_falha", "gauge", "URLs que falharam após todas as tentativas.", [({}, len(rel["urls_com_falha"]))])
+        metrica("ultima_execucao_timestamp", "gauge", "Fim da execução (epoch).", [({}, int(time.time()))])
+        return "\n".join(linhas) + "\n"
+
+    def salvar(self, caminho_json=None, caminho_prometheus=None):
+        rel = self.relatorio()
+        caminho_json = caminho_json or RELATORIO_EXECUCAO
+        caminho_prometheus = caminho_prometheus or PROMETHEUS_TEXTFILE
+        try:
+            _gravar_json(caminho_json, rel, ensure_ascii=False, indent=2)
+            print(f"\n>>> RELATÓRIO: {caminho_json}")
+            if caminho_prometheus:
+                # textfile collector: grava em temporário e renomeia para nunca expor arquivo pela metade
+                temporario = caminho_prometheus + ".tmp"
+                with open(temporario, "w", encoding="utf-8") as f:
+                    f.write(self._prometheus(rel))
+                os.replace(temporario, caminho_prometheus)
+        except OSError as e:
+            print(f"   ⚠️ Relatório não salvo: {e}")
+        return rel
+
+metricas = Metricas()
+
 # --- AUTENTICAÇÃO CLOUD ---
 def obter_token_cloud():
+    """Refresh no launchpad (bloqueante); devolve o JSON com access_token e expires_in, ou None."""
     if not REFRESH_TOKEN_SECRETO:
         print("❌ ERRO: Segredo BASECAMP_REFRESH_TOKEN não encontrado.")
         return None
 
     print("🔄 Gerando Token de Acesso (Cloud)...")
-    url = "https://launchpad.37signals.com/authorization/token"
+    url = BASECAMP_TOKEN_URL
     payload = {
         "type": "refresh",
         "refresh_token": REFRESH_TOKEN_SECRETO,
@@ -141,9 +353,9 @@ def obter_token_cloud():
         "redirect_uri": REDIRECT_URI
     }
     try:
-        resp = requests.post(url, json=payload)
+        resp = requests.post(url, json=payload, timeout=HTTP_TIMEOUT)
         if resp.status_code == 200:
-            return resp.json()["access_token"]
+            return resp.json()
         else:
             print(f"❌ Falha auth: {resp.text}")
             return None
@@ -151,113 +363,554 @@ def obter_token_cloud():
         print(f"❌ Erro conexão: {e}")
         return None
 
+class CredencialBasecamp:
+    """Access token do Basecamp com a validade: refresh só perto de expirar ou num 401, um por vez."""
+    def __init__(self, caminho=None):
+        self.caminho = caminho if caminho is not None else TOKEN_CACHE_ARQUIVO
+        self.access_token = None
+        self.expira_em = 0.0
+        self.renovacoes = 0
+        self._lock = None
+
+    def _chave(self):
+        # Trocar o refresh token (ou a conta) invalida o token guardado
+        return hashlib.sha256(f"{ACCOUNT_ID}:{REFRESH_TOKEN_SECRETO}".encode()).hexdigest()
+
+    def _carregar(self):
+        if not self.caminho: return
+        dados = _ler_json(self.caminho)
+        if isinstance(dados, dict) and dados.get("chave") == self._chave():
+            self.access_token, self.expira_em = dados.get("access_token"), float(dados.get("expira_em", 0))
+
+    def _salvar(self):
+        if not self.caminho: return
+        try: _gravar_json(self.caminho, {"chave": self._chave(), "access_token": self.access_token, "expira_em": self.expira_em}, modo=0o600)
+        except OSError as e:
+            print(f"   ⚠️ Token não guardado: {e}")
+
+    def _aplicar(self, resposta):
+        self.access_token = resposta["access_token"]
+        self.expira_em = time.time() + float(resposta.get("expires_in") or TOKEN_VALIDADE_PADRAO)
+        self.renovacoes += 1
+        self._salvar()
+
+    def valido(self):
+        return bool(self.access_token) and self.expira_em - TOKEN_MARGEM_RENOVACAO > time.time()
+
+    def obter(self):
+        """Token válido para iniciar a execução (do arquivo configurado ou de um refresh), ou None."""
+        # TODO: migração temporária; remover (com TOKEN_CACHE_LEGADO) quando os caches do Actions anteriores a ela tiverem expirado
+        if os.path.abspath(TOKEN_CACHE_LEGADO) != os.path.abspath(self.caminho or "."):
+            try: os.remove(TOKEN_CACHE_LEGADO)
+            except OSError: pass
+        if not self.valido(): self._carregar()
+        if self.valido():
+            print("🔑 Token de Acesso reaproveitado do cache.")
+            return self.access_token
+        resposta = obter_token_cloud()
+        if not resposta: return None
+        self._aplicar(resposta)
+        return self.access_token
+
+    async def renovar(self, token_rejeitado=None):
+        """Refresh fora do loop de eventos; ignora o pedido se o token rejeitado já foi trocado."""
+        if self._lock is None: self._lock = asyncio.Lock()
+        async with self._lock:
+            if token_rejeitado is not None and token_rejeitado != self.access_token: return self.access_token
+            resposta = await asyncio.to_thread(obter_token_cloud)
+            if resposta: self._aplicar(resposta)
+            return self.access_token
+
+    @asynccontextmanager
+    async def manter_renovado(self):
+        """Renova o token em segundo plano antes de expirar enquanto o bloco estiver rodando."""
+        async def renovar_antes_de_expirar():
+            while True:
+                await asyncio.sleep(max(30.0, self.expira_em - TOKEN_MARGEM_RENOVACAO - time.time()))
+                if not self.valido(): await self.renovar(self.access_token)
+        tarefa = asyncio.create_task(renovar_antes_de_expirar())
+        try: yield self
+        finally:
+            tarefa.cancel()
+            try: await tarefa
+            except asyncio.CancelledError: pass
+
+# --- RETRY / RATE LIMIT ---
+class LimitadorTaxa:
+    """Janela deslizante de `capacidade` envios por `janela` segundos, compartilhada pelo crawl; um 429 pausa todos."""
+    def __init__(self, capacidade=None, janela=None):
+        self.capacidade = max(1, capacidade or BASECAMP_LIMITE_REQUISICOES)
+        self.janela = janela or BASECAMP_JANELA_SEGUNDOS
+        self._envios = deque()
+        self._pausado_ate = 0.0
+        self._lock = asyncio.Lock()
+
+    def pausar(self, segundos):
+        self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+
+    async def adquirir(self):
+        async with self._lock:
+            while True:
+                agora = time.monotonic()
+                if agora < self._pausado_ate:
+                    await asyncio.sleep(self._pausado_ate - agora)
+                    continue
+                while self._envios and agora - self._envios[0] >= self.janela: self._envios.popleft()
+                if len(self._envios) < self.capacidade:
+                    self._envios.append(agora)
+                    return
+                await asyncio.sleep(self._envios[0] + self.janela - agora)
+
+def calcular_backoff(tentativa):
+    """Backoff exponencial com jitter completo: uniforme em [0, min(máximo, base * 2^tentativa)]."""
+    return random.uniform(0, min(BACKOFF_MAXIMO, BACKOFF_BASE * (2 ** tentativa)))
+
+def ler_retry_after(valor):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos de espera."""
+    if not valor: return None
+    try: return max(0.0, float(valor))
+    except ValueError: pass
+    try: return max(0.0, (parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError): return None
+
+def status_retentavel(status_code):
+    return status_code == 429 or status_code >= 500
+
+def proximo_link(valor_link):
+    """Extrai a URL rel="next" de um cabeçalho Link; None quando é a última página."""
+    if not valor_link: return None
+    match = re.search(r'<([^>]+)>\s*;\s*rel="?next"?', valor_link)
+    return match.group(1) if match else None
+
+# --- CACHE CONDICIONAL (ETag / Last-Modified) ---
+VERSAO_CACHE_HTTP = 3  # 2: páginas de todos guardadas já projetadas; 3: recordings de todos com a posição
+
+class CacheCondicional:
+    """Validadores e corpo da última resposta de cada URL consultada na execução (JSON entre execuções)."""
+    def __init__(self, caminho=None):
+        self.caminho = caminho or CACHE_HTTP_ARQUIVO
+        self.entradas = {}
+        self._usadas = {}
+        self.reaproveitadas = 0
+
+    def carregar(self):
+        dados = _ler_json(self.caminho)
+        try: self.entradas = dados["entradas"] if dados.get("versao") == VERSAO_CACHE_HTTP else {}
+        except (KeyError, TypeError, AttributeError): self.entradas = {}
+        return self
+
+    def salvar(self):
+        _gravar_json(self.caminho, {"versao": VERSAO_CACHE_HTTP, "entradas": self._usadas})
+
+    def validadores(self, url):
+        entrada = self.entradas.get(url)
+        if not entrada: return {}
+        headers = {}
+        if entrada.get("etag"): headers["If-None-Match"] = entrada["etag"]
+        if entrada.get("last_modified"): headers["If-Modified-Since"] = entrada["last_modified"]
+        return headers
+
+    def reaproveitar(self, url):
+        entrada = self.entradas[url]
+        self._usadas[url] = entrada
+        self.reaproveitadas += 1
+        return entrada["corpo"], {"Link": entrada.get("link")}
+
+    def guardar(self, url, headers, corpo):
+        etag = headers.get("ETag"); last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified: return
+        entrada = {"etag": etag, "last_modified": last_modified, "link": headers.get("Link"), "corpo": corpo}
+        self.entradas[url] = entrada
+        self._usadas[url] = entrada
+
+# --- ESTADO DE SINCRONIA INCREMENTAL ---
+VERSAO_ESTADO = 3  # 2: guarda TarefaResumo, não o JSON completo; 3: marca com updated_at + completed_ratio
+
+def marca_de_mudanca(registro):
+    # Concluir ou arquivar um todo muda o completed_ratio da lista/grupo mesmo que o updated_at fique igual
+    if not registro.get('updated_at'): return None
+    return f"{registro.get('updated_at')}|{registro.get('completed_ratio')}"
+
+class EstadoSincronia:
+    """Tarefas já baixadas por bucket/lista/grupo, com a marca_de_mudanca que as gerou (SQLite)."""
+    def __init__(self, caminho=None, ignorar_leitura=False):
+        self.caminho = caminho or ESTADO_SINCRONIA_ARQUIVO
+        self.ignorar_leitura = ignorar_leitura
+        self.reaproveitados = 0
+        _criar_pasta(self.caminho)
+        self.conn = sqlite3.connect(self.caminho)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != VERSAO_ESTADO:
+            # Formato antigo (todos completos em JSON): descarta e recomeça
+            self.conn.execute("DROP TABLE IF EXISTS sincronia")
+            self.conn.execute(f"PRAGMA user_version = {VERSAO_ESTADO}")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sincronia (
+                bucket_id INTEGER NOT NULL,
+                todolist_id INTEGER NOT NULL,
+                grupo_id INTEGER NOT NULL,
+                marca TEXT,
+                todos TEXT NOT NULL,
+                PRIMARY KEY (bucket_id, todolist_id, grupo_id)
+            )""")
+
+    def _ler(self, bucket_id, todolist_id, grupo_id, registro):
+        marca = marca_de_mudanca(registro)
+        if self.ignorar_leitura or not marca: return None
+        row = self.conn.execute(
+            "SELECT marca, todos FROM sincronia WHERE bucket_id=? AND todolist_id=? AND grupo_id=?",
+            (bucket_id, todolist_id, grupo_id)).fetchone()
+        if not row or row[0] != marca: return None
+        self.reaproveitados += 1
+        return [TarefaResumo(*campos) for campos in json.loads(row[1])]
+
+    def tarefas_raiz(self, bucket_id, todolist):
+        return self._ler(bucket_id, todolist.get('id'), 0, todolist)
+
+    def tarefas_grupo(self, bucket_id, todolist_id, group):
+        return self._ler(bucket_id, todolist_id, group.get('id'), group)
+
+    def guardar(self, bucket_id, todolist_id, grupo_id, registro, todos):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sincronia (bucket_id, todolist_id, grupo_id, marca, todos) VALUES (?, ?, ?, ?, ?)",
+            (bucket_id, todolist_id, grupo_id, marca_de_mudanca(registro), json.dumps(todos)))
+
+    def podar(self, bucket_id, todolist_ids):
+        """Remove listas do bucket que saíram da seleção (ex.: semanas além de LIMITE_LISTAS_RECENTES)."""
+        marcadores = ",".join("?" * len(todolist_ids))
+        filtro = f" AND todolist_id NOT IN ({marcadores})" if todolist_ids else ""
+        self.conn.execute(f"DELETE FROM sincronia WHERE bucket_id=?{filtro}", (bucket_id, *todolist_ids))
+
+    def podar_grupos(self, bucket_id, todolist_id, grupo_ids):
+        marcadores = ",".join("?" * len(grupo_ids))
+        filtro = f" AND grupo_id NOT IN ({marcadores})" if grupo_ids else ""
+        self.conn.execute(
+            f"DELETE FROM sincronia WHERE bucket_id=? AND todolist_id=? AND grupo_id<>0{filtro}",
+            (bucket_id, todolist_id, *grupo_ids))
+
+    def fechar(self):
+        self.conn.commit()
+        self.conn.close()
+
+def lista_em_andamento(todolist, hoje=None):
+    """Semana corrente (ou posterior) ou lista sem data (backlogs): sempre rebaixada, sem o estado incremental."""
+    data = extrair_data_da_lista_dt(todolist.get('title'))
+    if pd.isnull(data): return True
+    hoje = hoje or datetime.now()
+    return data >= pd.Timestamp((hoje - timedelta(days=hoje.weekday())).date())
+
+# --- AGENDADOR DO CRAWL ---
+class ControleCrawl:
+    """Teto global, teto por host e taxa do Basecamp para cada requisição em voo, mais as URLs que falharam."""
+    def __init__(self, max_concorrencia=None, max_por_host=None, limitador=None, cache=None, estado=None, credencial=None, account_id=None, destino=None):
+        self.max_concorrencia = max(1, max_concorrencia or MAX_CONCORRENCIA)
+        self.max_por_host = max(1, max_por_host or MAX_CONCORRENCIA_POR_HOST)
+        self._global = asyncio.Semaphore(self.max_concorrencia)
+        self._hosts = {}
+        self.limitador = limitador or LimitadorTaxa()
+        self.urls_com_falha = []
+        self.cache = cache
+        self.estado = estado
+        self.credencial = credencial
+        self.account_id = account_id or ACCOUNT_ID
+        self.destino = destino
+
+    def entregar(self, bucket_id, list_url, chave, resumos):
+        """Repassa uma página de TarefaResumo ao destino (DestinoTarefas) assim que ela chega."""
+        if self.destino is not None: self.destino.receber(bucket_id, list_url, chave, resumos)
+
+    def registrar_falha(self, url, status_code):
+        self.urls_com_falha.append((url, status_code))
+        metricas.urls_com_falha.append((url, status_code))
+
+    def houve_falha(self, urls):
+        """True se alguma falha registrada pertence a uma das URLs base (qualquer variante/página)."""
+        return any(falha.startswith(url) for falha, _ in self.urls_com_falha for url in urls)
+
+    def relatorio_falhas(self):
+        if self.cache is not None:
+            print(f"\n>>> CACHE HTTP: {self.cache.reaproveitadas} resposta(s) 304 reaproveitada(s).")
+        if self.estado is not None:
+            print(f">>> ESTADO INCREMENTAL: {self.estado.reaproveitados} lista(s)/grupo(s) sem mudança reaproveitados.")
+        if not self.urls_com_falha:
+            print("\n>>> CRAWL COMPLETO: nenhuma URL falhou.")
+            return
+        print(f"\n⚠️ CRAWL PARCIAL: {len(self.urls_com_falha)} URL(s) falharam após {MAX_RETRIES} tentativas:")
+        for url, status_code in self.urls_com_falha:
+            print(f"   ❌ [{status_code or 'erro de rede'}] {url}")
+
+    def _semaforo_host(self, url):
+        host = urlparse(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.max_por_host)
+        return self._hosts[host]
+
+    @asynccontextmanager
+    async def limitar(self, url):
+        """Reserva uma vaga global e uma do host de url enquanto a requisição estiver em voo."""
+        async with self._global:
+            async with self._semaforo_host(url):
+                # A vaga da taxa só depois dos semáforos: o horário guardado é o do envio real
+                await self.limitador.adquirir()
+                yield
+
+def criar_sessao_http(pool_size=None):
+    """Sessão aiohttp compartilhada pelo crawl inteiro (keep-alive HTTP/1.1, pool limitado)."""
+    connector = aiohttp.TCPConnector(
+        limit=pool_size or HTTP_POOL_SIZE,
+        limit_per_host=MAX_CONCORRENCIA_POR_HOST,
+        keepalive_timeout=30,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT))
+
+# --- PROJEÇÃO E ACUMULAÇÃO DE TAREFAS ---
+# Só os campos que a planilha usa; o resto do JSON (creator, bucket, parent...) é descartado na chegada
+TarefaResumo = namedtuple("TarefaResumo", [
+    "id", "title", "status", "completed", "trashed", "created_at", "completion_created_at", "app_url",
+    "hierarquia_semana", "hierarquia_grupo", "parent_list_url",
+])
+COLUNAS_CATEGORICAS = ["status", "hierarquia_semana", "hierarquia_grupo", "parent_list_url"]
+
+def projetar_todo(t):
+    """Campos de TarefaResumo que vêm do próprio todo (os três últimos são a hierarquia onde ele foi achado)."""
+    conclusao = t.get('completion')
+    return [t.get('id'), t.get('title'), t.get('status'), bool(t.get('completed')), bool(t.get('trashed')),
+            t.get('created_at'), conclusao.get('created_at') if isinstance(conclusao, dict) else None, t.get('app_url')]
+
+def projetar_pagina(todos):
+    # É a página projetada (não o JSON completo) que fica na memória e no cache condicional
+    return [projetar_todo(t) for t in todos]
+
+class AcumuladorTarefas:
+    """Buffers por coluna, deduplicados por id na entrada; as linhas saem na ordem das chaves dos lotes."""
+    def __init__(self):
+        self._posicao = {}
+        self._chaves = []
+        self._lotes = 0
+        self._colunas = {campo: [] for campo in TarefaResumo._fields}
+
+    def adicionar(self, resumos, chave=None):
+        """Os lotes podem chegar em qualquer ordem: entre ids repetidos fica o de menor chave (a 1ª ocorrência no crawl serial)."""
+        if chave is None: chave = (self._lotes,)
+        self._lotes += 1
+        for i, r in enumerate(resumos):
+            chave_linha = chave + (i,)
+            pos = self._posicao.get(r.id)
+            if pos is None:
+                self._posicao[r.id] = len(self._chaves)
+                self._chaves.append(chave_linha)
+                for campo, valor in zip(TarefaResumo._fields, r): self._colunas[campo].append(valor)
+            elif chave_linha < self._chaves[pos]:
+                self._chaves[pos] = chave_linha
+                for campo, valor in zip(TarefaResumo._fields, r): self._colunas[campo][pos] = valor
+
+    def __len__(self):
+        return len(self._chaves)
+
+    def _ordem(self):
+        return sorted(range(len(self._chaves)), key=self._chaves.__getitem__)
+
+    def resumos(self):
+        colunas = [self._colunas[campo] for campo in TarefaResumo._fields]
+        return [TarefaResumo(*(valores[j] for valores in colunas)) for j in self._ordem()]
+
+    def para_dataframe(self):
+        ordem = self._ordem()
+        dados = {}
+        for campo, valores in self._colunas.items():
+            valores = [valores[j] for j in ordem]
+            if campo in COLUNAS_CATEGORICAS:
+                valores = ["" if v is None else v for v in valores]
+                categorias = list(dict.fromkeys(valores + [""]))  # "" sempre presente para o fillna("")
+                dados[campo] = pd.Categorical(valores, categories=categorias)
+            elif campo in ("completed", "trashed"):
+                dados[campo] = np.array(valores, dtype=bool)
+            elif campo == "id":
+                dados[campo] = pd.array(valores, dtype="Int64")
+            else:
+                dados[campo] = np.array(valores, dtype=object)
+        return pd.DataFrame(dados)
+
+class DestinoTarefas:
+    """Acumulador por alvo: cada página vai para os alvos que selecionaram a lista, com a chave de ordem do crawl serial de cada um."""
+    def __init__(self):
+        self._alvos = {}
+
+    def registrar_alvo(self, nome, buckets):
+        self._alvos[nome] = (AcumuladorTarefas(), {b: i for i, b in enumerate(buckets)}, {})
+
+    def registrar_selecao(self, nome, bucket_id, listas):
+        self._alvos[nome][2][bucket_id] = {l.get('app_url'): i for i, l in enumerate(listas)}
+
+    def receber(self, bucket_id, list_url, chave, resumos):
+        for acumulador, buckets, selecoes in self._alvos.values():
+            posicao = selecoes.get(bucket_id, {}).get(list_url)
+            if posicao is not None and bucket_id in buckets:
+                acumulador.adicionar(resumos, (buckets[bucket_id], posicao) + chave)
+
+    def acumulador(self, nome):
+        return self._alvos[nome][0]
+
 # --- MOTOR DE BUSCA ---
-async def fetch_greedy_async(token, url):
+async def requisitar_json(session, url, headers, controle, projetar=None):
+    """GET com retry (429/5xx/rede), cache condicional, `projetar` e renovação do token num 401: (status, json, headers); status None se a rede falhou."""
+    cache = controle.cache
+    credencial = controle.credencial
+    if cache is not None: headers = {**headers, **cache.validadores(url)}
+    status_code = None
+    renovou = False
+    for tentativa in range(MAX_RETRIES):
+        espera = None
+        token_usado = None
+        if credencial is not None and credencial.access_token:
+            token_usado = credencial.access_token
+            headers = {**headers, "Authorization": f"Bearer {token_usado}"}
+        try:
+            async with controle.limitar(url):
+                inicio = time.perf_counter()
+                async with session.get(url, headers=headers) as response:
+                    status_code = response.status
+                    bruto = await response.read()
+                    metricas.registrar_http(url, status_code, len(bruto), tentativa, time.perf_counter() - inicio)
+                    if status_code == 304 and cache is not None and url in cache.entradas:
+                        corpo, headers_cache = cache.reaproveitar(url)
+                        return 200, corpo, headers_cache
+                    if status_code == 200:
+                        corpo = json.loads(bruto) if bruto else None
+                        if projetar is not None and corpo is not None: corpo = projetar(corpo)
+                        if cache is not None: cache.guardar(url, response.headers, corpo)
+                        return status_code, corpo, response.headers
+                    if status_code == 401 and token_usado is not None and not renovou:
+                        espera = 0
+                    elif not status_retentavel(status_code): return status_code, None, response.headers
+                    else: espera = ler_retry_after(response.headers.get("Retry-After"))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            metricas.registrar_http(url, None, 0, tentativa, 0.0)
+            status_code = None
+        if status_code == 401:
+            # Fora dos semáforos: o refresh não segura vagas das outras requisições
+            await credencial.renovar(token_usado); renovou = True
+            continue
+        if espera is not None: controle.limitador.pausar(espera)
+        else: espera = calcular_backoff(tentativa)
+        if tentativa < MAX_RETRIES - 1: await asyncio.sleep(espera)
+    return status_code, None, {}
+
+async def fetch_greedy_async(token, url, session, controle=None, projetar=None, entregar=None):
+    """Todas as páginas de url; com `entregar(n_pagina, itens)`, cada página vai para o destino e nada é acumulado."""
     items = []
     page = 1
+    n_pagina = 0
+    if controle is None: controle = ControleCrawl()
     if not url.startswith("http"):
-        base_url = f"https://3.basecampapi.com/{ACCOUNT_ID}"
+        base_url = f"{BASECAMP_API_BASE}/{controle.account_id}"
         url = f"{base_url}{url}"
     connector = "&" if "?" in url else "?"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
 
-    while True:
-        target_url = f"{url}{connector}page={page}"
-        success = False
-        for attempt in range(MAX_RETRIES):
-            try:
-                response = await asyncio.to_thread(requests.get, target_url, headers=headers)
-                if response.status_code == 404: 
-                    success = True; break
-                if response.status_code != 200:
-                    time.sleep(1); continue
-                data = response.json()
-                if not data: 
-                    success = True; break
-                items.extend(data)
-                page += 1
-                success = True
-                await asyncio.to_thread(a_second)
-                break 
-            except: time.sleep(1)
-        if success and (not data if 'data' in locals() else True): break
-        if not success: break 
+    target_url = url if MODO_PAGINACAO == "link" else f"{url}{connector}page={page}"
+    while target_url:
+        status_code, data, headers_resp = await requisitar_json(session, target_url, headers, controle, projetar)
+        if status_code == 404: break
+        if status_code != 200:
+            controle.registrar_falha(target_url, status_code); break
+        if not data: break
+        if entregar is not None: entregar(n_pagina, data)
+        else: items.extend(data)
+        n_pagina += 1
+        if MODO_PAGINACAO == "link":
+            target_url = proximo_link(headers_resp.get("Link"))
+        else:
+            page += 1
+            target_url = f"{url}{connector}page={page}"
     return items
 
-async def descobrir_bucket_ids(token):
+async def descobrir_projetos(token, session, controle=None):
     print("\n>>> BUSCANDO PROJETOS ATIVOS...")
     projects_url = f"/projects.json"
-    all_projects = await fetch_greedy_async(token, projects_url)
-    ids_encontrados = []
-    print("   Projetos localizados:")
-    for p in all_projects:
-        pid = p.get('id'); pname = p.get('name', '').upper()
-        if any(chave in pname for chave in PALAVRAS_CHAVE_PROJETO):
-            ids_encontrados.append(pid)
-            print(f"   ✅ [MATCH] {pname} (ID: {pid})")
-    if not ids_encontrados: print("   ❌ NENHUM PROJETO ENCONTRADO.")
-    return ids_encontrados
-
-async def extract_tasks_complete(token, bucket_id, todolist):
-    tasks_bucket = []
+    return await fetch_greedy_async(token, projects_url, session, controle)
+
+def projeto_casa(projeto, palavras_chave=None):
+    pname = projeto.get('name', '').upper()
+    return any(chave in pname for chave in (palavras_chave or PALAVRAS_CHAVE_PROJETO))
+
+async def fetch_variantes(token, url, sufixos, session, controle, projetar=None, entregar=None):
+    """url com cada sufixo em paralelo; com `entregar(n_variante, n_pagina, itens)`, as páginas vão direto ao destino."""
+    resultados = await asyncio.gather(*[
+        fetch_greedy_async(token, url + sufixo, session, controle, projetar, None if entregar is None else partial(entregar, v))
+        for v, sufixo in enumerate(sufixos)])
+    return [item for parte in resultados for item in parte]
+
+SUFIXOS_TODOS = ["", "?completed=true", "?status=archived"]
+
+async def baixar_todos(token, url, session, controle, bucket_id, list_app_url, semana, grupo, parte):
+    """Todos de uma lista ou grupo entregues página a página; (quantidade, tarefas), estas só com estado incremental."""
+    paginas = [] if controle.estado is not None else None
+    quantidade = 0
+    def entregar(variante, n_pagina, linhas):
+        nonlocal quantidade
+        resumos = [TarefaResumo(*linha, semana, grupo, list_app_url) for linha in linhas]
+        quantidade += len(resumos)
+        controle.entregar(bucket_id, list_app_url, parte + (variante, n_pagina), resumos)
+        if paginas is not None: paginas.append(((variante, n_pagina), resumos))
+    await fetch_variantes(token, url, SUFIXOS_TODOS, session, controle, projetar_pagina, entregar)
+    if paginas is None: return quantidade, None
+    return quantidade, [r for _, resumos in sorted(paginas, key=lambda p: p[0]) for r in resumos]
+
+async def extract_group_tasks(token, bucket_id, list_id, group, posicao, list_name, list_app_url, session, controle, reaproveitar=True):
+    target_link = group.get('todos_url')
+    if not target_link: return 0
+    parte = (1, posicao)  # grupos depois da raiz, na ordem de groups.json
+    estado = controle.estado
+    if estado is not None and reaproveitar:
+        guardadas = estado.tarefas_grupo(bucket_id, list_id, group)
+        if guardadas is not None:
+            controle.entregar(bucket_id, list_app_url, parte + (0, 0), guardadas)
+            return len(guardadas)
+    quantidade, group_items = await baixar_todos(token, target_link, session, controle, bucket_id, list_app_url, list_name, group['title'], parte)
+    if estado is not None and not controle.houve_falha([target_link]):
+        estado.guardar(bucket_id, list_id, group.get('id'), group, group_items)
+    return quantidade
+
+async def extract_tasks_complete(token, bucket_id, todolist, session, controle=None):
+    if controle is None: controle = ControleCrawl()
     list_id = todolist.get('id'); list_name = todolist.get('title'); list_app_url = todolist.get('app_url')
-    print(f"\n   📂 {list_name}...", end=" ")
 
     todos_url = todolist.get('todos_url')
-    if not todos_url: todos_url = f"https://3.basecampapi.com/{ACCOUNT_ID}/buckets/{bucket_id}/todolists/{list_id}/todos.json"
-
-    root_items = []
-    root_items += await fetch_greedy_async(token, todos_url)
-    root_items += await fetch_greedy_async(token, todos_url + "?completed=true")
-    root_items += await fetch_greedy_async(token, todos_url + "?status=archived")
-
-    for t in root_items:
-        t['hierarquia_semana'] = list_name; t['hierarquia_grupo'] = "(Raiz)"; t['parent_list_url'] = list_app_url
-    tasks_bucket.extend(root_items)
-    print(f"| Raiz: {len(root_items)}", end=" ")
-
-    groups_url = f"https://3.basecampapi.com/{ACCOUNT_ID}/buckets/{bucket_id}/todolists/{list_id}/groups.json"
-    all_groups = []
-    all_groups += await fetch_greedy_async(token, groups_url)
-    all_groups += await fetch_greedy_async(token, groups_url + "?status=archived")
-    
-    total_grupos_items = 0
-    if all_groups:
-        for g in all_groups:
-            target_link = g.get('todos_url')
-            if target_link:
-                group_items = []
-                group_items += await fetch_greedy_async(token, target_link)
-                group_items += await fetch_greedy_async(token, target_link + "?completed=true")
-                group_items += await fetch_greedy_async(token, target_link + "?status=archived")
-                for t in group_items:
-                    t['hierarquia_semana'] = list_name; t['hierarquia_grupo'] = g['title']; t['parent_list_url'] = list_app_url
-                tasks_bucket.extend(group_items)
-                total_grupos_items += len(group_items)
-                print(".", end="", flush=True)
-
-    print(f"| G: {total_grupos_items} | T: {len(tasks_bucket)}")
-    return tasks_bucket
-
-async def process_bucket(token, bucket_id):
-    print(f"\n>>> PROCESSANDO BUCKET {bucket_id}")
-    api_base = f"https://3.basecampapi.com/{ACCOUNT_ID}"
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        r = requests.get(f"{api_base}/projects/{bucket_id}.json", headers=headers); proj = r.json()
-        todoset_id = next((t['id'] for t in proj.get('dock', []) if t['name'] == 'todoset'), None)
-    except: return []
-    if not todoset_id: return []
+    if not todos_url: todos_url = f"{BASECAMP_API_BASE}/{controle.account_id}/buckets/{bucket_id}/todolists/{list_id}/todos.json"
+    groups_url = f"{BASECAMP_API_BASE}/{controle.account_id}/buckets/{bucket_id}/todolists/{list_id}/groups.json"
 
-    url_lists = f"{api_base}/buckets/{bucket_id}/todosets/{todoset_id}/todolists.json"
-    all_lists = []
-    all_lists += await fetch_greedy_async(token, url_lists)
-    all_lists += await fetch_greedy_async(token, url_lists + "?status=archived")
-    
+    # O índice de grupos é sempre consultado (é barato com ETag); a raiz só se a lista mudou
+    estado = controle.estado
+    reaproveitar = estado is not None and not lista_em_andamento(todolist)
+    raiz_guardada = estado.tarefas_raiz(bucket_id, todolist) if reaproveitar else None
+    if raiz_guardada is not None:
+        controle.entregar(bucket_id, list_app_url, (0, 0, 0), raiz_guardada)
+        total_raiz = len(raiz_guardada)
+        all_groups = await fetch_variantes(token, groups_url, ["", "?status=archived"], session, controle)
+    else:
+        (total_raiz, root_items), all_groups = await asyncio.gather(
+            baixar_todos(token, todos_url, session, controle, bucket_id, list_app_url, list_name, "(Raiz)", (0,)),
+            fetch_variantes(token, groups_url, ["", "?status=archived"], session, controle),
+        )
+        if estado is not None and not controle.houve_falha([todos_url]):
+            estado.guardar(bucket_id, list_id, 0, todolist, root_items)
+    if estado is not None and not controle.houve_falha([groups_url]):
+        estado.podar_grupos(bucket_id, list_id, [g.get('id') for g in all_groups])
+
+    grupos = await asyncio.gather(*[extract_group_tasks(token, bucket_id, list_id, g, i, list_name, list_app_url, session, controle, reaproveitar)
+                                    for i, g in enumerate(all_groups)])
+    total_grupos_items = sum(grupos)
+
+    print(f"   📂 {list_name} | Raiz: {total_raiz} | G: {total_grupos_items} | T: {total_raiz + total_grupos_items}")
+    return total_raiz + total_grupos_items
+
+def selecionar_listas(all_lists, termos=None):
+    """Listas-alvo de um bucket: todos os backlogs + as LIMITE_LISTAS_RECENTES semanas mais recentes."""
     listas_alvo = []
     for l in all_lists:
         titulo = l.get('title', '').upper()
-        if any(termo in titulo for termo in TERMOS_DE_BUSCA_LISTAS): listas_alvo.append(l)
+        if any(termo in titulo for termo in (termos or TERMOS_DE_BUSCA_LISTAS)): listas_alvo.append(l)
 
     backlogs = [l for l in listas_alvo if "BACKLOG" in l.get('title', '').upper()]
     semanas  = [l for l in listas_alvo if "BACKLOG" not in l.get('title', '').upper()]
@@ -267,224 +920,838 @@ async def process_bucket(token, bucket_id):
         return d if pd.notnull(d) else datetime.min
     semanas.sort(key=sort_key, reverse=True)
     if LIMITE_LISTAS_RECENTES > 0: semanas = semanas[:LIMITE_LISTAS_RECENTES]
+    return backlogs + semanas
+
+async def process_bucket(token, bucket_id, session, controle=None, selecionar=None):
+    with metricas.etapa(f"crawl_bucket_{bucket_id}"):
+        return await _process_bucket(token, bucket_id, session, controle, selecionar)
+
+async def _process_bucket(token, bucket_id, session, controle=None, selecionar=None):
+    if controle is None: controle = ControleCrawl()
+    print(f"\n>>> PROCESSANDO BUCKET {bucket_id}")
+    api_base = f"{BASECAMP_API_BASE}/{controle.account_id}"
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        project_url = f"{api_base}/projects/{bucket_id}.json"
+        status_code, proj, _ = await requisitar_json(session, project_url, headers, controle)
+        if status_code != 200:
+            controle.registrar_falha(project_url, status_code); return
+        todoset_id = next((t['id'] for t in proj.get('dock', []) if t['name'] == 'todoset'), None)
+    except Exception as e:
+        metricas.registrar_erro(f"crawl_bucket_{bucket_id}", e); return
+    if not todoset_id: return
 
-    lista_final = backlogs + semanas
-    print(f"   Selecionadas: {len(lista_final)}")
+    url_lists = f"{api_base}/buckets/{bucket_id}/todosets/{todoset_id}/todolists.json"
+    all_lists = await fetch_variantes(token, url_lists, ["", "?status=archived"], session, controle)
+    lista_final = selecionar(bucket_id, all_lists) if selecionar else selecionar_listas(all_lists)
+    print(f"   Bucket {bucket_id} | Selecionadas: {len(lista_final)}")
+    if controle.estado is not None and not controle.houve_falha([url_lists]):
+        controle.estado.podar(bucket_id, [l.get('id') for l in lista_final])
+
+    await asyncio.gather(*[extract_tasks_complete(token, bucket_id, todolist, session, controle) for todolist in lista_final])
+
+async def coletar_por_bucket(token, bucket_ids, session, controle=None, selecionar=None):
+    """Crawl concorrente dos buckets; `selecionar(bucket_id, listas)` troca a seleção padrão de listas."""
+    if controle is None: controle = ControleCrawl()
+    await asyncio.gather(*[process_bucket(token, bucket_id, session, controle, selecionar) for bucket_id in bucket_ids])
+
+# --- MOTOR ALTERNATIVO: RECORDINGS EM LOTE ---
+def projetar_recordings(todos):
+    # Recording de todo: os campos de TarefaResumo + o id do pai (lista ou grupo) e a posição nele
+    return [projetar_todo(t) + [(t.get('parent') or {}).get('id'), t.get('position') or 0] for t in todos]
+
+async def coletar_recordings_por_bucket(token, bucket_ids, session, controle=None, selecionar=None):
+    """Mesmas tarefas de coletar_por_bucket via /projects/recordings.json, ordenadas pela `position` de cada todo."""
+    if controle is None: controle = ControleCrawl()
+    print("\n>>> BAIXANDO TAREFAS VIA RECORDINGS...")
+    base = f"/projects/recordings.json?bucket={','.join(str(b) for b in bucket_ids)}"
+    recordings_listas = await fetch_variantes(token, base + "&type=Todolist", ["&status=active", "&status=archived"], session, controle)
+
+    listas = {}
+    for bucket_id in bucket_ids:
+        do_bucket = [r for r in recordings_listas
+                     if (r.get('parent') or {}).get('type') == 'Todoset' and (r.get('bucket') or {}).get('id') == bucket_id]
+        lista_final = selecionar(bucket_id, do_bucket) if selecionar else selecionar_listas(do_bucket)
+        print(f"   Bucket {bucket_id} | Selecionadas: {len(lista_final)}")
+        listas.update((l['id'], l) for l in lista_final)
+    grupos_por_lista = await asyncio.gather(*[
+        fetch_variantes(token, f"{BASECAMP_API_BASE}/{controle.account_id}/buckets/{l['bucket']['id']}/todolists/{l['id']}/groups.json",
+                        ["", "?status=archived"], session, controle)
+        for l in listas.values()])
+    grupos = {g['id']: (lista, i, g.get('title')) for lista, do_lista in zip(listas.values(), grupos_por_lista) for i, g in enumerate(do_lista)}
+
+    recebidos = 0; aproveitados = 0
+    def entregar(stream, n_pagina, linhas):
+        nonlocal recebidos, aproveitados
+        recebidos += len(linhas)
+        for i, (*campos, pai, posicao) in enumerate(linhas):
+            if pai in listas:
+                lista = listas[pai]; parte = (0,); grupo = "(Raiz)"
+            elif pai in grupos:
+                lista, n_grupo, grupo = grupos[pai]; parte = (1, n_grupo)
+            else:
+                continue
+            aproveitados += 1
+            variante = 2 if campos[2] == 'archived' else (1 if campos[3] else 0)
+            controle.entregar(lista['bucket']['id'], lista.get('app_url'), parte + (variante, posicao, stream, n_pagina, i),
+                              [TarefaResumo(*campos, lista.get('title'), grupo, lista.get('app_url'))])
+    await fetch_variantes(token, base + "&type=Todo", ["&status=active", "&status=archived"], session, controle, projetar_recordings, entregar)
+    print(f"   Todos recebidos: {recebidos} | Nas listas selecionadas: {aproveitados}")
 
-    bucket_tasks = []
-    for todolist in lista_final:
-        tasks = await extract_tasks_complete(token, bucket_id, todolist)
-        bucket_tasks.extend(tasks)
-    return bucket_tasks
+# --- SESSÃO DA PLANILHA ---
+def _nome_range(nome_aba):
+    return "'" + nome_aba.replace("'", "''") + "'"
+
+class SessaoPlanilha:
+    """Planilha aberta uma vez por execução: leituras num values_batch_get e escritas enfileiradas até `descarregar`."""
+    def __init__(self, gc, titulo=None, folder_id=None):
+        self.spreadsheet = gc.open(title=titulo or os.getenv("SPREADSHEET_NAME"), folder_id=folder_id or os.getenv("FOLDER_ID"))
+        self.abas = {ws.title: ws for ws in self.spreadsheet.worksheets()}
+        self._valores = {}
+        self._colunas = {}
+        self._modificadas = set()
+        self._pedidos = []
+        self._escritas = []
+
+    def worksheet(self, nome_aba):
+        if nome_aba not in self.abas: raise gspread.exceptions.WorksheetNotFound(nome_aba)
+        return self.abas[nome_aba]
+
+    def add_worksheet(self, title, rows, cols):
+        ws = self.spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+        self.abas[title] = ws
+        self._valores[title] = []
+        return ws
+
+    def pre_carregar(self, nomes_abas, colunas=None):
+        """Lê num único values_batch_get as abas ainda não carregadas (de `colunas`, {aba: letra}, só essa coluna)."""
+        faltando = [n for n in dict.fromkeys(nomes_abas) if n in self.abas and n not in self._valores]
+        colunas_faltando = [(n, l) for n, l in (colunas or {}).items()
+                            if n in self.abas and n not in self._valores and (n, l) not in self._colunas]
+        if not faltando and not colunas_faltando: return
+        faixas = [_nome_range(n) for n in faltando] + [f"{_nome_range(n)}!{l}:{l}" for n, l in colunas_faltando]
+        resposta = self.spreadsheet.values_batch_get(faixas).get("valueRanges", [])
+        for nome, faixa in zip(faltando, resposta):
+            linhas = faixa.get("values", [])
+            largura = max((len(l) for l in linhas), default=0)
+            self._valores[nome] = [l + [""] * (largura - len(l)) for l in linhas]  # mesmo formato de get_all_values
+        for chave, faixa in zip(colunas_faltando, resposta[len(faltando):]):
+            self._colunas[chave] = [l[0] if l else "" for l in faixa.get("values", [])]
+
+    def valores(self, nome_aba):
+        self.worksheet(nome_aba)
+        if nome_aba not in self._valores: self.pre_carregar([nome_aba])
+        return self._valores[nome_aba]
+
+    def coluna(self, nome_aba, letra="A"):
+        """Valores de uma coluna da aba, da linha 1 até a última preenchida."""
+        self.worksheet(nome_aba)
+        if nome_aba in self._valores:
+            indice = gspread.utils.a1_to_rowcol(f"{letra}1")[1] - 1
+            return [(l[indice] if indice < len(l) else "") for l in self._valores[nome_aba]]
+        if (nome_aba, letra) not in self._colunas: self.pre_carregar([], colunas={nome_aba: letra})
+        return self._colunas[(nome_aba, letra)]
+
+    def modificado_em(self, consultar=False):
+        """modifiedTime da planilha no Drive: o do gc.open, ou uma consulta nova com `consultar`."""
+        if not consultar:
+            # gspread já recebe o modifiedTime na busca do gc.open por título
+            modificado = getattr(self.spreadsheet, "_properties", {}).get("modifiedTime")
+            if modificado: return modificado
+        return self.spreadsheet.get_lastUpdateTime()
+
+    def carregada(self, nome_aba):
+        return nome_aba in self._valores
+
+    def modificada(self, nome_aba):
+        """True se o conteúdo visto é o de uma escrita ainda não confirmada pela planilha."""
+        return nome_aba in self._modificadas
+
+    def registrar_valores(self, nome_aba, linhas):
+        self._valores[nome_aba] = linhas
+        self._modificadas.add(nome_aba)
+
+    def supor_valores(self, nome_aba, linhas):
+        """Conteúdo já conhecido da aba (ex.: o publicado na última execução, com a planilha intacta), sem lê-la."""
+        if nome_aba in self.abas and nome_aba not in self._valores: self._valores[nome_aba] = linhas
+
+    def enfileirar(self, pedidos):
+        self._pedidos.extend(pedidos)
+
+    def enfileirar_valores(self, nome_aba, faixa, linhas):
+        self._escritas.append({"range": f"{_nome_range(nome_aba)}!{faixa}", "values": linhas})
+
+    def descarregar(self):
+        """Envia a fila: um batch_update (estrutura) e depois um values_batch_update (USER_ENTERED)."""
+        if self._pedidos:
+            self.spreadsheet.batch_update({"requests": self._pedidos})
+            self._pedidos = []
+        if self._escritas:
+            self.spreadsheet.values_batch_update({"valueInputOption": "USER_ENTERED", "data": self._escritas})
+            self._escritas = []
+
+# --- ESCRITA INCREMENTAL NO SHEETS ---
+def _chaves_por_ocorrencia(valores):
+    """(valor, n-ésima ocorrência): mantém chaves únicas mesmo com IDs repetidos (ex.: aba consolidada)."""
+    vistos = {}; chaves = []
+    for v in valores:
+        n = vistos.get(v, 0); vistos[v] = n + 1
+        chaves.append((v, n))
+    return chaves
+
+def _blocos_contiguos(indices):
+    """Agrupa índices ordenados em faixas [inicio, fim)."""
+    blocos = []
+    for i in sorted(indices):
+        if blocos and blocos[-1][1] == i: blocos[-1][1] = i + 1
+        else: blocos.append([i, i + 1])
+    return blocos
+
+def _faixa_linhas(linha_inicial, n_linhas, n_cols):
+    """Faixa A1 de n_linhas a partir de linha_inicial (0-based), da coluna A até a n_cols."""
+    return f"A{linha_inicial + 1}:{gspread.utils.rowcol_to_a1(linha_inicial + n_linhas, n_cols)}"
+
+def _garantir_grade(ws, linhas, colunas, linhas_removidas=0):
+    pedidos = []
+    faltam_linhas = linhas - (ws.row_count - linhas_removidas)
+    if faltam_linhas > 0:
+        pedidos.append({"appendDimension": {"sheetId": ws.id, "dimension": "ROWS", "length": faltam_linhas}})
+    if colunas > ws.col_count:
+        pedidos.append({"appendDimension": {"sheetId": ws.id, "dimension": "COLUMNS", "length": colunas - ws.col_count}})
+    return pedidos
+
+def sincronizar_aba(sessao, nome_aba, df_upload, chave='ID', linhas_extra=100):
+    """Enfileira só a diferença entre a aba e df_upload, casando as linhas pela coluna `chave`."""
+    cabecalho = [str(c) for c in df_upload.columns]
+    n_cols = len(cabecalho)
+    novas = df_upload.astype(str).values.tolist()
+    try:
+        ws = sessao.worksheet(nome_aba)
+        atuais = sessao.valores(nome_aba)
+    except gspread.exceptions.WorksheetNotFound:
+        ws = sessao.add_worksheet(title=nome_aba, rows=len(novas) + linhas_extra, cols=max(20, n_cols))
+        atuais = []
+
+    pedidos = []
+    if atuais and atuais[0] == cabecalho and chave in cabecalho:
+        col = cabecalho.index(chave)
+        linhas_atuais = [(linha + [""] * n_cols)[:n_cols] for linha in atuais[1:]]
+        pos_atual = dict(zip(_chaves_por_ocorrencia([l[col] for l in linhas_atuais]), range(len(linhas_atuais))))
+        chaves_novas = _chaves_por_ocorrencia([l[col] for l in novas])
+
+        alteradas = {}; inseridas = []
+        for k, linha in zip(chaves_novas, novas):
+            i = pos_atual.get(k)
+            if i is None: inseridas.append(linha)
+            elif linhas_atuais[i] != linha: alteradas[i + 1] = linha  # +1: cabeçalho
+        mantidas = set(chaves_novas)
+        removidas = [i + 1 for k, i in pos_atual.items() if k not in mantidas]
+        # Como a aba fica depois da escrita: ordem atual, sem as removidas, com as novas no fim
+        removidas_set = set(removidas)
+        resultado = [alteradas.get(i + 1, l) for i, l in enumerate(linhas_atuais) if i + 1 not in removidas_set] + inseridas
+
+        # Remoções (de baixo para cima) vão no batch_update, que a sessão envia antes dos valores:
+        # as linhas alteradas são gravadas no índice que terão depois das remoções
+        for inicio, fim in reversed(_blocos_contiguos(removidas)):
+            pedidos.append({"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": inicio, "endIndex": fim}}})
+        removidas_ordenadas = sorted(removidas)
+        realocadas = {i - bisect.bisect_left(removidas_ordenadas, i): linha for i, linha in alteradas.items()}
+        for inicio, fim in _blocos_contiguos(realocadas):
+            sessao.enfileirar_valores(nome_aba, _faixa_linhas(inicio, fim - inicio, n_cols), [realocadas[i] for i in range(inicio, fim)])
+        if inseridas:
+            primeira_livre = len(atuais) - len(removidas)
+            pedidos += _garantir_grade(ws, primeira_livre + len(inseridas), n_cols, len(removidas))
+            sessao.enfileirar_valores(nome_aba, _faixa_linhas(primeira_livre, len(inseridas), n_cols), inseridas)
+        resumo = f"{len(alteradas)} alterada(s), {len(inseridas)} nova(s), {len(removidas)} removida(s)"
+        metricas.registrar_aba(nome_aba, len(novas), len(alteradas), len(inseridas), len(removidas))
+    else:
+        pedidos += _garantir_grade(ws, len(novas) + 1, n_cols)
+        # Só as sobras (linhas abaixo e colunas à direita) são limpas; o resto é sobrescrito pelos valores
+        pedidos.append({"updateCells": {"range": {"sheetId": ws.id, "startRowIndex": len(novas) + 1}, "fields": "userEnteredValue"}})
+        pedidos.append({"updateCells": {"range": {"sheetId": ws.id, "startColumnIndex": n_cols}, "fields": "userEnteredValue"}})
+        sessao.enfileirar_valores(nome_aba, _faixa_linhas(0, len(novas) + 1, n_cols), [cabecalho] + novas)
+        resumo = f"reescrita completa ({len(novas)} linha(s))"
+        metricas.registrar_aba(nome_aba, len(novas), novas=len(novas))
+        resultado = novas
+
+    sessao.enfileirar(pedidos)
+    sessao.registrar_valores(nome_aba, [cabecalho] + resultado)
+    print(f"      ↳ {nome_aba}: {resumo}")
+    return ws
+
+def upsert_linha(sessao, nome_aba, linha, cabecalho, linhas_extra=1000):
+    """Grava `linha` onde a coluna A vale linha[0] (lendo só a coluna A), ou no fim da aba; devolve o número da linha."""
+    try:
+        ws = sessao.worksheet(nome_aba)
+        chaves = sessao.coluna(nome_aba, "A")
+    except gspread.exceptions.WorksheetNotFound:
+        ws = sessao.add_worksheet(title=nome_aba, rows=linhas_extra, cols=len(cabecalho))
+        chaves = sessao.coluna(nome_aba, "A")
+    if not chaves:
+        sessao.enfileirar_valores(nome_aba, f"A1:{gspread.utils.rowcol_to_a1(1, len(cabecalho))}", [cabecalho])
+        chaves.append(cabecalho[0])
+
+    chave = str(linha[0])
+    numero = next((i + 1 for i in range(len(chaves) - 1, 0, -1) if chaves[i] == chave), None)
+    if numero is None:
+        chaves.append(chave)
+        numero = len(chaves)
+        if numero > ws.row_count:
+            sessao.enfileirar([{"appendDimension": {"sheetId": ws.id, "dimension": "ROWS", "length": linhas_extra}}])
+    sessao.enfileirar_valores(nome_aba, f"A{numero}:{gspread.utils.rowcol_to_a1(numero, len(linha))}", [linha])
+    return numero
 
 # --- LÓGICA DE DADOS ---
-def processar_mes_atual(df_completo, gc, df_equipes):
+def _coluna(df, nome, padrao=None):
+    return df[nome] if nome in df.columns else pd.Series(padrao, index=df.index, dtype=object)
+
+# Colunas datetime64 canônicas geradas no tratamento; as abas só as convertem em texto ao publicar
+COLUNAS_DATAS = ['Data_Ref_Lista', 'Data_Criacao', 'Data_Conclusao', 'Sexta_Limite']
+COLUNAS_ABAS = ['ID', 'Status', 'Atividades Semanal', 'Sub-Lista / Grupo', 'Nome Task', 'Encarregado', 'Data Inicial', 'Data Final', 'Link', 'Link Lista']
+
+def _data_local_iso(serie):
+    # Data local já escrita no ISO 8601 do Basecamp ('2025-01-08T10:00:00.000-03:00' -> 2025-01-08), sem trocar de fuso
+    return pd.to_datetime(serie.astype('string').str.slice(0, 10), format='%Y-%m-%d', errors='coerce')
+
+def _data_texto(serie):
+    return serie.dt.strftime('%d/%m/%Y').fillna('').astype(object)
+
+def colunas_publicacao(df, data_final=None):
+    """Recorte de df nas colunas das abas, com as datas formatadas dd/mm/aaaa (só aqui viram texto)."""
+    saida = df.assign(**{'Data Inicial': _data_texto(df['Data_Criacao']),
+                         'Data Final': _data_texto(df['Data_Conclusao'] if data_final is None else data_final)})
+    return saida[[c for c in COLUNAS_ABAS if c in saida.columns]].fillna("")
+
+def tratar_tarefas(df):
+    """Etapa de tratamento colunar: renomeia campos, gera as COLUNAS_DATAS e calcula Status sem apply por linha."""
+    df['ID'] = df.get('id', '')
+    df['Nome Task'] = df.get('title', '')
+    df['Atividades Semanal'] = df.get('hierarquia_semana', '')
+    df['Sub-Lista / Grupo'] = df.get('hierarquia_grupo', '')
+    df['Link'] = df.get('app_url', '')
+    df['Link Lista'] = df.get('parent_list_url', '')
+    
+    df['Data_Ref_Lista'] = datas_das_listas(df['Atividades Semanal'])
+    df['Data_Criacao'] = _data_local_iso(_coluna(df, 'created_at'))
+    df['Data_Conclusao'] = _data_local_iso(_coluna(df, 'completion_created_at'))
+    df['Sexta_Limite'] = df['Data_Ref_Lista'] + pd.Timedelta(days=4)
+
+    status = _coluna(df, 'status')
+    trashed = _coluna(df, 'trashed', False).fillna(False).astype(bool)
+    completed = _coluna(df, 'completed', False).fillna(False).astype(bool)
+    df['Status'] = np.select(
+        [status == 'archived', trashed, completed],
+        ["Arquivado", "Lixeira", "Fechado"],
+        default="Aberto",
+    )
+    return df
+
+def processar_mes_atual(df_completo, sessao, indice_equipes):
     print("\n>>> VERIFICANDO ABA DO MÊS ATUAL...")
     hoje = datetime.now()
     mes_atual = hoje.month; ano_atual = hoje.year
     nome_aba_atual = f"{MESES_NUM_PT[mes_atual]} {ano_atual}"
 
-    df_completo['Data_Ref_Lista'] = df_completo['Atividades Semanal'].apply(extrair_data_da_lista_dt)
     mask_mes_atual = (df_completo['Data_Ref_Lista'].dt.month == mes_atual) & (df_completo['Data_Ref_Lista'].dt.year == ano_atual)
     df_mes = df_completo[mask_mes_atual].copy()
     
     if df_mes.empty: print(f"   ⚠️ Nada para {nome_aba_atual}."); return
     print(f"   📅 Atualizando: '{nome_aba_atual}'")
 
-    if 'Data Final' in df_mes.columns:
-        df_mes['Data_Final_Obj'] = pd.to_datetime(df_mes['Data Final'], dayfirst=True, errors='coerce')
-        df_mes['Sexta_Limite'] = df_mes['Data_Ref_Lista'] + pd.Timedelta(days=4)
-        mask_ajuste = (df_mes['Data_Final_Obj'].notna()) & (df_mes['Data_Final_Obj'] > df_mes['Sexta_Limite'])
-        df_mes.loc[mask_ajuste, 'Data Final'] = df_mes.loc[mask_ajuste, 'Sexta_Limite'].dt.strftime('%d/%m/%Y')
-        df_mes = df_mes.drop(columns=['Data_Final_Obj', 'Sexta_Limite'])
+    # Conclusões depois da sexta da semana contam na própria semana
+    data_final = df_mes['Data_Conclusao'].mask(df_mes['Data_Conclusao'] > df_mes['Sexta_Limite'], df_mes['Sexta_Limite'])
 
-    if not df_equipes.empty:
-        df_mes['Encarregado'] = df_mes['Sub-Lista / Grupo'].apply(lambda x: encontrar_encarregado(x, df_equipes))
+    if indice_equipes:
+        df_mes['Encarregado'] = atribuir_encarregados(df_mes['Sub-Lista / Grupo'], indice_equipes)
 
-    cols_final = ['ID', 'Status', 'Atividades Semanal', 'Sub-Lista / Grupo', 'Nome Task', 'Encarregado', 'Data Inicial', 'Data Final', 'Link', 'Link Lista']
-    df_upload = df_mes[[c for c in cols_final if c in df_mes.columns]].fillna("")
+    df_upload = colunas_publicacao(df_mes, data_final)
     
     try:
-        spreadsheet = gc.open(title=os.getenv("SPREADSHEET_NAME"), folder_id=os.getenv("FOLDER_ID"))
-        try: worksheet = spreadsheet.worksheet(nome_aba_atual); worksheet.clear()
-        except gspread.exceptions.WorksheetNotFound: worksheet = spreadsheet.add_worksheet(title=nome_aba_atual, rows=len(df_upload)+100, cols=20)
-        data = [df_upload.columns.values.tolist()] + df_upload.astype(str).values.tolist()
-        worksheet.update(data, value_input_option='USER_ENTERED')
+        with metricas.etapa(f"aba_{nome_aba_atual}"): sincronizar_aba(sessao, nome_aba_atual, df_upload)
         print(f"      ✅ Sucesso!")
-    except Exception as e: print(f"      ❌ Erro upload: {e}")
+    except Exception as e:
+        metricas.registrar_erro(nome_aba_atual, e); print(f"      ❌ Erro upload: {e}")
 
-def atualizar_aba_backlog(df_global, gc, df_equipes):
+def atualizar_aba_backlog(df_global, sessao, indice_equipes):
     print(f"\n>>> ATUALIZANDO ABA '{NOME_ABA_BACKLOG}'...")
     mask_backlog = df_global['Atividades Semanal'].astype(str).str.contains("BACKLOG", case=False, na=False)
     df_backlog = df_global[mask_backlog].copy()
     if df_backlog.empty: print("   ⚠️ Vazio."); return
 
-    if not df_equipes.empty:
-         df_backlog['Encarregado'] = df_backlog['Sub-Lista / Grupo'].apply(lambda x: encontrar_encarregado(x, df_equipes))
+    if indice_equipes:
+         df_backlog['Encarregado'] = atribuir_encarregados(df_backlog['Sub-Lista / Grupo'], indice_equipes)
 
-    cols_final = ['ID', 'Status', 'Atividades Semanal', 'Sub-Lista / Grupo', 'Nome Task', 'Encarregado', 'Data Inicial', 'Data Final', 'Link', 'Link Lista']
-    for c in cols_final:
-        if c not in df_backlog.columns: df_backlog[c] = ""
-    df_upload = df_backlog[cols_final].fillna("")
+    df_upload = colunas_publicacao(df_backlog)
+    for c in COLUNAS_ABAS:
+        if c not in df_upload.columns: df_upload[c] = ""
+    df_upload = df_upload[COLUNAS_ABAS]
 
     try:
-        spreadsheet = gc.open(title=os.getenv("SPREADSHEET_NAME"), folder_id=os.getenv("FOLDER_ID"))
-        try: worksheet = spreadsheet.worksheet(NOME_ABA_BACKLOG); worksheet.clear()
-        except gspread.exceptions.WorksheetNotFound: worksheet = spreadsheet.add_worksheet(title=NOME_ABA_BACKLOG, rows=len(df_upload)+100, cols=20)
-        data = [df_upload.columns.values.tolist()] + df_upload.astype(str).values.tolist()
-        worksheet.update(data, value_input_option='USER_ENTERED')
+        with metricas.etapa(f"aba_{NOME_ABA_BACKLOG}"): sincronizar_aba(sessao, NOME_ABA_BACKLOG, df_upload)
         print(f"   ✅ Atualizado!")
-    except: pass
+    except Exception as e:
+        metricas.registrar_erro(NOME_ABA_BACKLOG, e); print(f"   ❌ Erro upload: {e}")
+
+class CacheConsolidacao:
+    """Meses fechados filtrados e a última consolidada publicada, válidos enquanto o modifiedTime não mudar (JSON)."""
+    def __init__(self, caminho=None):
+        self.caminho = caminho or CONSOLIDACAO_ARQUIVO
+        self.entradas = {}
+        self.publicada = None
+        self.modificado_em = None
+
+    def carregar(self):
+        dados = _ler_json(self.caminho)
+        try: self.modificado_em, self.entradas, self.publicada = dados["modificado_em"], dados["abas"], dados.get("publicada")
+        except (KeyError, TypeError, AttributeError): self.modificado_em, self.entradas, self.publicada = None, {}, None
+        return self
+
+    def salvar(self, abas_existentes):
+        _gravar_json(self.caminho, {"modificado_em": self.modificado_em, "publicada": self.publicada,
+                                    "abas": {k: v for k, v in self.entradas.items() if k in abas_existentes}})
+
+    def valido(self, modificado_em):
+        return bool(modificado_em) and modificado_em == self.modificado_em
 
-def consolidar_meses_para_notas(gc):
+    def obter(self, nome_aba):
+        entrada = self.entradas.get(nome_aba)
+        if not entrada: return None
+        if not entrada["colunas"]: return entrada["hash"], None
+        return entrada["hash"], pd.DataFrame(entrada["linhas"], columns=entrada["colunas"])
+
+    def guardar(self, nome_aba, hash_conteudo, df_filtrado):
+        vazio = df_filtrado is None or df_filtrado.empty
+        self.entradas[nome_aba] = {
+            "hash": hash_conteudo,
+            "colunas": [] if vazio else df_filtrado.columns.tolist(),
+            "linhas": [] if vazio else df_filtrado.values.tolist(),
+        }
+
+    def descartar(self, nome_aba):
+        self.entradas.pop(nome_aba, None)
+
+def hash_conteudo_aba(raw_data):
+    return hashlib.sha1(json.dumps(raw_data, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def filtrar_aba_mensal(nome_aba, raw_data):
+    """Linhas da aba "Mês Ano" cuja Data Final cai no próprio mês (ou está vazia); None se nada sobrar."""
+    mes_aba, ano_aba = extrair_mes_ano_do_nome_aba(nome_aba)
+    if not raw_data: return None
+    headers = raw_data[0]; rows = raw_data[1:]
+    df_aba = pd.DataFrame(rows, columns=headers)
+    if 'Data Final' not in df_aba.columns: return None
+    df_aba['Data_Final_DT'] = converter_data_segura(df_aba['Data Final'])
+    mask_correto = ((df_aba['Data_Final_DT'].dt.month == mes_aba) & (df_aba['Data_Final_DT'].dt.year == ano_aba)) | (df_aba['Data_Final_DT'].isna())
+    df_filtrado = df_aba[mask_correto].copy().drop(columns=['Data_Final_DT'])
+    if df_filtrado.empty: return None
+    df_filtrado['Origem_Aba'] = nome_aba
+    return df_filtrado
+
+def consolidar_meses_para_notas(sessao, cache=None, modificado_em=None):
+    """Junta os meses em NOME_ABA_CONSOLIDADA; meses fechados vêm do `cache` se ele vale para `modificado_em`."""
     print("\n>>> CONSOLIDANDO NOTAS...")
-    try:
-        spreadsheet = gc.open(title=os.getenv("SPREADSHEET_NAME"), folder_id=os.getenv("FOLDER_ID"))
-        all_worksheets = spreadsheet.worksheets()
-    except: return
+    hoje = datetime.now()
+    if cache is not None: cache.publicada = None
+    abas_mensais = [nome for nome in sessao.abas if extrair_mes_ano_do_nome_aba(nome)]
+    confiavel = cache is not None and cache.valido(modificado_em)
+
+    def fechada(nome_aba):
+        mes_aba, ano_aba = extrair_mes_ano_do_nome_aba(nome_aba)
+        return (ano_aba, mes_aba) < (hoje.year, hoje.month)
+
+    def congelada(nome_aba):
+        return confiavel and fechada(nome_aba) and cache.obter(nome_aba) is not None
+
+    try: sessao.pre_carregar([n for n in abas_mensais if not congelada(n)])
+    except Exception as e:
+        metricas.registrar_erro(NOME_ABA_CONSOLIDADA, e); print(f"   ❌ Erro na leitura dos meses: {e}"); return
 
     dfs_para_consolidar = []
-    for ws in all_worksheets:
-        mes_ano = extrair_mes_ano_do_nome_aba(ws.title)
-        if mes_ano:
-            mes_aba, ano_aba = mes_ano
-            try:
-                raw_data = ws.get_all_values()
-                if not raw_data: continue
-                headers = raw_data[0]; rows = raw_data[1:]
-                df_aba = pd.DataFrame(rows, columns=headers)
-                
-                if 'Data Final' in df_aba.columns:
-                    df_aba['Data_Final_DT'] = converter_data_segura(df_aba['Data Final'])
-                    mask_correto = ((df_aba['Data_Final_DT'].dt.month == mes_aba) & (df_aba['Data_Final_DT'].dt.year == ano_aba)) | (df_aba['Data_Final_DT'].isna())
-                    df_filtrado = df_aba[mask_correto].copy().drop(columns=['Data_Final_DT'])
-                    if not df_filtrado.empty:
-                        df_filtrado['Origem_Aba'] = ws.title 
-                        dfs_para_consolidar.append(df_filtrado)
-            except: pass
+    reaproveitadas = 0
+    for nome_aba in abas_mensais:
+        try:
+            if congelada(nome_aba) and not sessao.carregada(nome_aba):
+                _, df_filtrado = cache.obter(nome_aba)
+                reaproveitadas += 1
+            else:
+                raw_data = sessao.valores(nome_aba)
+                hash_atual = hash_conteudo_aba(raw_data)
+                # Aba escrita nesta execução (o mês atual): valores ainda não formatados pelo Sheets, nunca vão para o cache
+                if cache is not None and sessao.modificada(nome_aba): cache.descartar(nome_aba)
+                guardada = cache.obter(nome_aba) if cache is not None else None
+                if guardada is not None and guardada[0] == hash_atual:
+                    df_filtrado = guardada[1]
+                else:
+                    df_filtrado = filtrar_aba_mensal(nome_aba, raw_data)
+                    if cache is not None and fechada(nome_aba) and not sessao.modificada(nome_aba): cache.guardar(nome_aba, hash_atual, df_filtrado)
+            if df_filtrado is not None: dfs_para_consolidar.append(df_filtrado)
+        except Exception as e:
+            metricas.registrar_erro(nome_aba, e); print(f"   ⚠️ Aba '{nome_aba}' ignorada: {e}")
+    if cache is not None: print(f"   Meses congelados reaproveitados: {reaproveitadas}/{len(abas_mensais)}")
 
     if dfs_para_consolidar:
         df_final = pd.concat(dfs_para_consolidar, ignore_index=True)
         try:
-            try: ws_cons = spreadsheet.worksheet(NOME_ABA_CONSOLIDADA); ws_cons.clear()
-            except gspread.exceptions.WorksheetNotFound: ws_cons = spreadsheet.add_worksheet(title=NOME_ABA_CONSOLIDADA, rows=len(df_final)+500, cols=20)
-            data = [df_final.columns.values.tolist()] + df_final.astype(str).values.tolist()
-            ws_cons.update(data, value_input_option='USER_ENTERED')
+            with metricas.etapa(f"aba_{NOME_ABA_CONSOLIDADA}"): sincronizar_aba(sessao, NOME_ABA_CONSOLIDADA, df_final, linhas_extra=500)
+            # A próxima execução compara com esta cópia em vez de baixar a aba inteira
+            if cache is not None: cache.publicada = sessao.valores(NOME_ABA_CONSOLIDADA)
             print("   ✅ Atualizado!")
-        except: pass
+        except Exception as e:
+            metricas.registrar_erro(NOME_ABA_CONSOLIDADA, e); print(f"   ❌ Erro upload: {e}")
 
-def atualizar_historico_diario(df_global, gc):
+def atualizar_historico_diario(df_global, sessao):
     print("\n>>> HISTÓRICO DIÁRIO...")
     hoje = datetime.now()
     inicio_semana = hoje - timedelta(days=hoje.weekday()) 
     
-    df_global['Data_Ref_Lista'] = df_global['Atividades Semanal'].apply(extrair_data_da_lista_dt)
-    df_global['Data_Ref_Lista'] = pd.to_datetime(df_global['Data_Ref_Lista']).dt.date
-    inicio_semana_date = inicio_semana.date()
-    
-    df_semana = df_global[df_global['Data_Ref_Lista'] == inicio_semana_date]
+    df_semana = df_global[df_global['Data_Ref_Lista'] == pd.Timestamp(inicio_semana.date())]
     total_tarefas = len(df_semana)
-    fechadas = df_semana[df_semana['Data Final'].astype(str).str.len() > 5].shape[0]
+    fechadas = int(df_semana['Data_Conclusao'].notna().sum())
     
     try:
-        spreadsheet = gc.open(title=os.getenv("SPREADSHEET_NAME"), folder_id=os.getenv("FOLDER_ID"))
-        try: ws_hist = spreadsheet.worksheet(NOME_ABA_HISTORICO)
-        except gspread.exceptions.WorksheetNotFound:
-            ws_hist = spreadsheet.add_worksheet(title=NOME_ABA_HISTORICO, rows=1000, cols=3)
-            ws_hist.append_row(["Data", "Total_Fechadas", "Total_Tarefas"]) 
-            
-        dados_existentes = ws_hist.get_all_values()
-        hoje_str = hoje.strftime('%d/%m/%Y')
-        linha_encontrada = None
-        for i, row in enumerate(dados_existentes):
-            if i == 0: continue 
-            if row[0] == hoje_str:
-                linha_encontrada = i + 1 
-                break
-        
-        nova_linha = [hoje_str, fechadas, total_tarefas]
-        if linha_encontrada: ws_hist.update(range_name=f"A{linha_encontrada}:C{linha_encontrada}", values=[nova_linha], value_input_option='USER_ENTERED')
-        else: ws_hist.append_row(nova_linha, value_input_option='USER_ENTERED')
+        nova_linha = [hoje.strftime('%d/%m/%Y'), fechadas, total_tarefas]
+        upsert_linha(sessao, NOME_ABA_HISTORICO, nova_linha, ["Data", "Total_Fechadas", "Total_Tarefas"])
+        metricas.registrar_aba(NOME_ABA_HISTORICO, 1)
         print("   ✅ Atualizado!")
-    except: pass
+    except Exception as e:
+        metricas.registrar_erro(NOME_ABA_HISTORICO, e); print(f"   ❌ Erro upload: {e}")
 
-async def main_process():
-    print(f"=== INICIANDO SINCRONIA CLOUD ===")
-    configurar_google_credentials()
-    gc = conectar_google_sheets() # GERA O CLIENTE GSPREAD
-    if not gc: return
+class CacheEquipes:
+    """Última leitura da aba Equipes, válida enquanto o modifiedTime da planilha não mudar (JSON entre execuções)."""
+    def __init__(self, caminho=None):
+        self.caminho = caminho or EQUIPES_CACHE_ARQUIVO
+        self.modificado_em = None
+        self.linhas = None
 
-    token = obter_token_cloud()
-    if not token: return
+    def carregar(self):
+        dados = _ler_json(self.caminho)
+        try: self.modificado_em, self.linhas = dados["modificado_em"], dados["linhas"]
+        except (KeyError, TypeError): self.modificado_em, self.linhas = None, None
+        return self
 
-    # 1. DESCOBRIR PROJETOS
-    buckets_dinamicos = await descobrir_bucket_ids(token)
-    if not buckets_dinamicos: return
+    def salvar(self):
+        _gravar_json(self.caminho, {"modificado_em": self.modificado_em, "linhas": self.linhas}, ensure_ascii=False)
 
-    # 2. BAIXAR TAREFAS
-    all_tasks = []
-    for bucket_id in buckets_dinamicos:
-        tasks = await process_bucket(token, bucket_id)
-        all_tasks.extend(tasks)
+    def obter(self, modificado_em):
+        return self.linhas if self.linhas is not None and modificado_em and modificado_em == self.modificado_em else None
 
-    df = pd.DataFrame(all_tasks).drop_duplicates(subset='id', keep='first')
-    
-    # 3. TRATAMENTO
-    df['ID'] = df.get('id', '')
-    df['Nome Task'] = df.get('title', '')
-    df['Atividades Semanal'] = df.get('hierarquia_semana', '')
-    df['Sub-Lista / Grupo'] = df.get('hierarquia_grupo', '')
-    df['Link'] = df.get('app_url', '')
-    df['Link Lista'] = df.get('parent_list_url', '')
-    
-    df['Data Inicial'] = ''
-    if 'created_at' in df.columns:
-        df['Data Inicial'] = pd.to_datetime(df['created_at'], errors='coerce').dt.strftime('%d/%m/%Y')
-
-    def get_completion(row):
-        if isinstance(row.get('completion'), dict):
-            d = row['completion'].get('created_at')
-            if d: return pd.to_datetime(d).strftime('%d/%m/%Y')
-        return ''
-    df['Data Final'] = df.apply(get_completion, axis=1)
-
-    def get_status(row):
-        if row.get('status') == 'archived': return "Arquivado"
-        if row.get('trashed'): return "Lixeira"
-        if row.get('completed'): return "Fechado"
-        return "Aberto"
-    df['Status'] = df.apply(get_status, axis=1)
-    
+    def guardar(self, linhas, modificado_em):
+        self.linhas, self.modificado_em = linhas, modificado_em
+
+# --- ALVOS DE SINCRONIA ---
+AlvoSincronia = namedtuple("AlvoSincronia", ["nome", "account_id", "palavras_chave_projeto", "termos_listas", "planilha", "pasta"])
+
+def alvo_padrao():
+    """O alvo das configurações do topo do arquivo (execução de uma planilha só)."""
+    return AlvoSincronia("", ACCOUNT_ID, PALAVRAS_CHAVE_PROJETO, TERMOS_DE_BUSCA_LISTAS,
+                         os.getenv("SPREADSHEET_NAME"), os.getenv("FOLDER_ID"))
+
+def carregar_alvos(config=None):
+    """Alvos de ALVOS_SINCRONIA (JSON direto ou caminho de arquivo); sem configuração, [alvo_padrao()]."""
+    config = (ALVOS_SINCRONIA if config is None else config).strip()
+    if not config: return [alvo_padrao()]
+    if not config.startswith(("[", "{")):
+        with open(config, "r", encoding="utf-8") as f: config = f.read()
+    dados = json.loads(config)
+    if isinstance(dados, dict): dados = dados.get("alvos", [])
+    padrao = alvo_padrao()
+    alvos = []
+    for item in dados:
+        nome = str(item.get("nome", ""))
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", nome):
+            raise ValueError(f"Alvo sem nome válido (letras, números, _ ou -): {item}")
+        if not item.get("planilha"): raise ValueError(f"Alvo '{nome}' sem planilha.")
+        alvos.append(AlvoSincronia(
+            nome, str(item.get("account_id") or padrao.account_id),
+            [p.upper() for p in item.get("palavras_chave_projeto") or padrao.palavras_chave_projeto],
+            [t.upper() for t in item.get("termos_listas") or padrao.termos_listas],
+            item["planilha"], item.get("pasta") or padrao.pasta))
+    nomes = [a.nome for a in alvos]
+    if not alvos or len(set(nomes)) != len(nomes): raise ValueError(f"ALVOS_SINCRONIA precisa de alvos com nomes únicos: {nomes}")
+    return alvos
+
+def buscar_alvo(nome=None):
+    alvos = carregar_alvos()
+    if nome is None and len(alvos) == 1: return alvos[0]
+    alvo = next((a for a in alvos if a.nome == nome), None)
+    if alvo is None: raise ValueError(f"Alvo '{nome}' não encontrado; opções: {[a.nome for a in alvos]}")
+    return alvo
+
+def caminho_do_alvo(caminho, alvo):
+    """Arquivo local (cache/snapshot) próprio do alvo: consolidacao.json -> consolidacao.time-a.json."""
+    if alvo is None or not alvo.nome: return caminho
+    raiz, extensao = os.path.splitext(caminho)
+    return f"{raiz}.{alvo.nome}{extensao}"
+
+# --- ETAPAS DO PIPELINE ---
+def salvar_snapshot(df, caminho):
+    """Grava o DataFrame em Parquet (tipos preservados, inclusive as categorias)."""
+    try:
+        _criar_pasta(caminho)
+        df.to_parquet(caminho, index=False)
+        print(f"   💾 Snapshot: {caminho} ({len(df)} linhas)")
+        return True
+    except (ImportError, OSError, ValueError) as e:
+        print(f"   ⚠️ Snapshot não salvo ({caminho}): {e}")
+        return False
+
+def carregar_snapshot(caminho):
+    print(f"\n>>> LENDO SNAPSHOT {caminho}...")
+    return pd.read_parquet(caminho)
+
+@asynccontextmanager
+async def renovacao_em_segundo_plano(credencial):
+    if credencial is None:
+        yield; return
+    async with credencial.manter_renovado(): yield
+
+async def extrair_alvos(token, alvos, full_resync=False, credencial=None):
+    """Crawl único para vários alvos: {alvo.nome: DataFrame sem tratamento}, cada bucket baixado uma vez só."""
+    # --full-resync: ignora ETags e o estado incremental, mas grava os novos para a próxima execução
+    cache_http = CacheCondicional()
+    if not full_resync: cache_http.carregar()
+    estado = EstadoSincronia(ignorar_leitura=full_resync)
+    limitador = LimitadorTaxa()  # o limite do Basecamp é do token, não da conta
+    controles = []
+    resultado = {}
+    try:
+        async with criar_sessao_http() as session, renovacao_em_segundo_plano(credencial):
+            for account_id in dict.fromkeys(a.account_id for a in alvos):
+                # Falha numa conta não derruba as outras; os alvos dela ficam de fora desta execução
+                try:
+                    da_conta = [a for a in alvos if a.account_id == account_id]
+                    destino = DestinoTarefas()
+                    controle = ControleCrawl(limitador=limitador, cache=cache_http, estado=estado, credencial=credencial, account_id=account_id, destino=destino)
+                    controles.append(controle)
+
+                    # 1. DESCOBRIR PROJETOS
+                    with metricas.etapa("descoberta"): projetos = await descobrir_projetos(token, session, controle)
+                    buckets_alvo = {a.nome: [p.get('id') for p in projetos if projeto_casa(p, a.palavras_chave_projeto)] for a in da_conta}
+                    buckets = list(dict.fromkeys(b for a in da_conta for b in buckets_alvo[a.nome]))
+                    print("   Projetos localizados:")
+                    for p in projetos:
+                        donos = [a.nome or "padrão" for a in da_conta if p.get('id') in buckets_alvo[a.nome]]
+                        if donos: print(f"   ✅ [MATCH] {p.get('name', '').upper()} (ID: {p.get('id')}) -> {', '.join(donos)}")
+                    if not buckets: print(f"   ❌ NENHUM PROJETO ENCONTRADO (conta {account_id}).")
+                    if not buckets: continue
+
+                    # 2. BAIXAR TAREFAS (buckets, listas, grupos e variantes em paralelo; cada página vai direto para o alvo)
+                    for a in da_conta:
+                        if buckets_alvo[a.nome]: destino.registrar_alvo(a.nome, buckets_alvo[a.nome])
+                    def selecionar(bucket_id, listas):
+                        uniao = {}
+                        for a in da_conta:
+                            if bucket_id not in buckets_alvo[a.nome]: continue
+                            selecionadas = selecionar_listas(listas, a.termos_listas)
+                            destino.registrar_selecao(a.nome, bucket_id, selecionadas)
+                            for l in selecionadas: uniao.setdefault(l.get('id'), l)
+                        return list(uniao.values())
+                    with metricas.etapa("crawl"):
+                        if MOTOR_CRAWL == "recordings":
+                            await coletar_recordings_por_bucket(token, buckets, session, controle, selecionar)
+                        else:
+                            await coletar_por_bucket(token, buckets, session, controle, selecionar)
+                    for a in da_conta:
+                        if buckets_alvo[a.nome]: resultado[a.nome] = destino.acumulador(a.nome).para_dataframe()
+                except Exception as e:
+                    metricas.registrar_erro(f"extracao_conta_{account_id}", e); print(f"❌ Conta {account_id}: {e}")
+    finally:
+        estado.fechar()
+    for controle in controles: controle.relatorio_falhas()
+    try: cache_http.salvar()
+    except OSError as e: print(f"   ⚠️ Cache HTTP não salvo: {e}")
+
+    metricas.cache_http = cache_http.reaproveitadas
+    metricas.cache_estado = estado.reaproveitados
+    return resultado
+
+def etapa_publicacao(df, gc, full_resync=False, alvo=None):
+    """Lê Equipes e publica todas as abas a partir do DataFrame já tratado (na planilha do alvo, se houver)."""
     # 4. LER EQUIPES
     print("\n>>> LENDO EQUIPES...")
     df_equipes = pd.DataFrame()
     try:
-        ss = gc.open(title=os.getenv("SPREADSHEET_NAME"), folder_id=os.getenv("FOLDER_ID"))
-        ws_eq = ss.worksheet(NOME_ABA_EQUIPES)
-        records_eq = ws_eq.get_all_records()
-        df_equipes = pd.DataFrame(records_eq)
-    except: print("   ⚠️ Erro Equipes")
+        sessao = SessaoPlanilha(gc, *((alvo.planilha, alvo.pasta) if alvo is not None else ()))
+    except Exception as e:
+        metricas.registrar_erro("publicacao", e); print(f"❌ Erro ao abrir a planilha: {e}"); return
+    hoje = datetime.now()
+    cache_equipes = CacheEquipes(caminho_do_alvo(EQUIPES_CACHE_ARQUIVO, alvo))
+    if not full_resync: cache_equipes.carregar()
+    try: modificado_abertura = sessao.modificado_em()
+    except Exception as e:
+        metricas.registrar_erro("modificado_em", e); modificado_abertura = None
+    valores_eq = cache_equipes.obter(modificado_abertura)
+    cache_consolidacao = CacheConsolidacao(caminho_do_alvo(CONSOLIDACAO_ARQUIVO, alvo))
+    if not full_resync: cache_consolidacao.carregar()
+    if cache_consolidacao.valido(modificado_abertura) and cache_consolidacao.publicada is not None:
+        sessao.supor_valores(NOME_ABA_CONSOLIDADA, cache_consolidacao.publicada)
+    try:
+        # Uma leitura em lote para todas as abas que a execução vai consultar ou comparar
+        # (as abas de meses fechados ficam com a consolidação, que pode reaproveitá-las do cache;
+        # do histórico só a coluna de datas; Equipes e a consolidada só se a planilha mudou desde a última execução)
+        sessao.pre_carregar([NOME_ABA_GERAL, NOME_ABA_BACKLOG, NOME_ABA_CONSOLIDADA, f"{MESES_NUM_PT[hoje.month]} {hoje.year}"]
+                            + ([NOME_ABA_EQUIPES] if valores_eq is None else []),
+                            colunas={NOME_ABA_HISTORICO: "A"})
+    except Exception as e:
+        metricas.registrar_erro("leitura_em_lote", e); print(f"   ⚠️ Erro na leitura em lote: {e}")
+    try:
+        if valores_eq is None:
+            valores_eq = sessao.valores(NOME_ABA_EQUIPES)
+            cache_equipes.guardar(valores_eq, sessao.modificado_em())
+        else:
+            print("   Equipes reaproveitada do cache (planilha sem alterações).")
+        if valores_eq: df_equipes = pd.DataFrame(valores_eq[1:], columns=valores_eq[0])
+    except Exception as e:
+        metricas.registrar_erro(NOME_ABA_EQUIPES, e); print(f"   ⚠️ Erro Equipes: {e}")
+    indice_equipes = indexar_equipes(df_equipes)
 
     # 5. EXECUÇÃO DAS ATUALIZAÇÕES
-    processar_mes_atual(df, gc, df_equipes)
+    processar_mes_atual(df, sessao, indice_equipes)
 
     print(f"\n>>> ATUALIZANDO GERAL...")
-    if not df_equipes.empty:
-        df['Encarregado'] = df['Sub-Lista / Grupo'].apply(lambda x: encontrar_encarregado(x, df_equipes))
+    if indice_equipes:
+        df['Encarregado'] = atribuir_encarregados(df['Sub-Lista / Grupo'], indice_equipes)
     
-    cols = ['ID', 'Status', 'Atividades Semanal', 'Sub-Lista / Grupo', 'Nome Task', 'Encarregado', 'Data Inicial', 'Data Final', 'Link', 'Link Lista']
-    final_df = df[[c for c in cols if c in df.columns]].fillna("")
+    final_df = colunas_publicacao(df)
     
     try:
-        ws = ss.worksheet(NOME_ABA_GERAL)
-        ws.clear()
-        ws.update([final_df.columns.values.tolist()] + final_df.astype(str).values.tolist(), value_input_option='USER_ENTERED')
+        with metricas.etapa(f"aba_{NOME_ABA_GERAL}"): sincronizar_aba(sessao, NOME_ABA_GERAL, final_df)
         print("✅ Geral OK.")
-    except: pass
+    except Exception as e:
+        metricas.registrar_erro(NOME_ABA_GERAL, e); print(f"❌ Erro upload: {e}")
+
+    atualizar_aba_backlog(df, sessao, indice_equipes)
+    with metricas.etapa("consolidacao"): consolidar_meses_para_notas(sessao, cache_consolidacao, modificado_abertura)
+    atualizar_historico_diario(df, sessao)
+
+    print("\n>>> PUBLICANDO ALTERAÇÕES NA PLANILHA...")
+    # Edição de terceiros entre a abertura e a escrita: o modifiedTime da escrita não pode validar o que foi lido antes
+    try: intacta = modificado_abertura is not None and sessao.modificado_em(consultar=True) == modificado_abertura
+    except Exception: intacta = False
+    cache_consolidacao.modificado_em = None
+    try:
+        with metricas.etapa("descarregar"): sessao.descarregar()
+        print("   ✅ Planilha atualizada!")
+    except Exception as e:
+        metricas.registrar_erro("descarregar", e); print(f"   ❌ Erro ao publicar: {e}")
+    else:
+        # A própria escrita muda o modifiedTime: ele vira o validador dos caches para a próxima execução
+        try: modificado_escrita = sessao.modificado_em(consultar=True) if intacta else None
+        except Exception: modificado_escrita = None
+        cache_consolidacao.modificado_em = modificado_escrita
+        if cache_equipes.linhas is not None:
+            # Com edição de terceiros desde a abertura, a Equipes lida pode estar velha: descarta e relê na próxima
+            if modificado_escrita: cache_equipes.guardar(cache_equipes.linhas, modificado_escrita)
+            else: cache_equipes.guardar(None, None)
+            try: cache_equipes.salvar()
+            except OSError as e: print(f"   ⚠️ Cache de Equipes não salvo: {e}")
+    try: cache_consolidacao.salvar(sessao.abas)
+    except OSError as e: print(f"   ⚠️ Cache da consolidação não salvo: {e}")
+
+def publicar_alvo(alvo, df, full_resync=False, gc=None):
+    """Tratamento + publicação de um alvo (roda numa thread do pool de publicar_alvos)."""
+    with metricas.alvo(alvo.nome):
+        if alvo.nome: print(f"\n=== ALVO {alvo.nome} -> {alvo.planilha} ===")
+        # Um cliente gspread por thread: a sessão HTTP dele não é compartilhada entre threads
+        gc = gc or conectar_google_sheets()
+        if not gc: raise RuntimeError("sem cliente do Google Sheets")
+
+        # 3. TRATAMENTO
+        with metricas.etapa("tratamento"): df = tratar_tarefas(df)
+        salvar_snapshot(df, caminho_do_alvo(SNAPSHOT_TRATADO, alvo))
+
+        with metricas.etapa("publicacao"): etapa_publicacao(df, gc, full_resync, alvo)
 
-    atualizar_aba_backlog(final_df, gc, df_equipes)
-    consolidar_meses_para_notas(gc)
-    atualizar_historico_diario(final_df, gc)
+def publicar_alvos(dfs, alvos, full_resync=False, gc=None):
+    """Publica os alvos em paralelo (até MAX_ALVOS_PARALELOS); a falha de um não interrompe os outros."""
+    pendentes = [a for a in alvos if a.nome in dfs]
+    for a in alvos:
+        if a.nome not in dfs: print(f"   ⚠️ Alvo {a.nome or 'padrão'}: nenhum projeto encontrado, nada a publicar.")
+    if len(pendentes) == 1:
+        try: publicar_alvo(pendentes[0], dfs[pendentes[0].nome], full_resync, gc)
+        except Exception as e:
+            metricas.registrar_erro(f"alvo_{pendentes[0].nome}", e); print(f"❌ Alvo {pendentes[0].nome}: {e}")
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_ALVOS_PARALELOS, len(pendentes)))) as pool:
+        futuros = {pool.submit(publicar_alvo, a, dfs[a.nome], full_resync): a for a in pendentes}
+        for futuro in as_completed(futuros):
+            alvo = futuros[futuro]
+            try:
+                futuro.result()
+                print(f"✅ Alvo {alvo.nome} publicado.")
+            except Exception as e:
+                metricas.registrar_erro(f"alvo_{alvo.nome}", e); print(f"❌ Alvo {alvo.nome}: {e}")
+
+async def main_process(full_resync=False):
+    print(f"=== INICIANDO SINCRONIA CLOUD ===")
+    alvos = carregar_alvos()
+    gc = conectar_google_sheets() # GERA O CLIENTE GSPREAD
+    if not gc: return
+
+    credencial = CredencialBasecamp()
+    token = credencial.obter()
+    if not token: return
+
+    with metricas.etapa("extracao"): dfs = await extrair_alvos(token, alvos, full_resync, credencial)
+    if not dfs: return
+    for alvo in alvos:
+        if alvo.nome in dfs: salvar_snapshot(dfs[alvo.nome], caminho_do_alvo(SNAPSHOT_EXTRACAO, alvo))
+
+    publicar_alvos(dfs, alvos, full_resync, gc if len(alvos) == 1 else None)
+
+# --- CLI: run (padrão) | extract | transform | publish ---
+async def comando_extract(args):
+    print(f"=== EXTRAÇÃO BASECAMP ===")
+    alvos = carregar_alvos()
+    if args.saida and len(alvos) > 1: raise SystemExit("--saida só vale com um alvo; cada alvo grava o próprio snapshot.")
+    credencial = CredencialBasecamp()
+    token = credencial.obter()
+    if not token: return
+    with metricas.etapa("extracao"): dfs = await extrair_alvos(token, alvos, args.full_resync, credencial)
+    for alvo in alvos:
+        if alvo.nome in dfs: salvar_snapshot(dfs[alvo.nome], args.saida or caminho_do_alvo(SNAPSHOT_EXTRACAO, alvo))
+
+def comando_transform(args):
+    print(f"=== TRATAMENTO ===")
+    alvo = buscar_alvo(args.alvo)
+    df = carregar_snapshot(args.entrada or caminho_do_alvo(SNAPSHOT_EXTRACAO, alvo))
+    with metricas.etapa("tratamento"): df = tratar_tarefas(df)
+    salvar_snapshot(df, args.saida or caminho_do_alvo(SNAPSHOT_TRATADO, alvo))
+
+def comando_publish(args):
+    print(f"=== PUBLICAÇÃO NO SHEETS ===")
+    alvo = buscar_alvo(args.alvo)
+    gc = conectar_google_sheets()
+    if not gc: return
+    df = carregar_snapshot(args.entrada or caminho_do_alvo(SNAPSHOT_TRATADO, alvo))
+    with metricas.etapa("publicacao"): etapa_publicacao(df, gc, args.full_resync, alvo)
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Sincroniza tarefas do Basecamp com o Google Sheets.")
+    ajuda_resync = "Ignora o cache local e baixa todas as listas de novo."
+    parser.add_argument("--full-resync", action="store_true", help=ajuda_resync)
+    # Também aceito depois da etapa; SUPPRESS evita que o padrão da etapa apague o valor dado antes dela
+    resync = argparse.ArgumentParser(add_help=False)
+    resync.add_argument("--full-resync", action="store_true", default=argparse.SUPPRESS, help=ajuda_resync)
+    etapas = parser.add_subparsers(dest="etapa", metavar="{run,extract,transform,publish}")
+    etapas.add_parser("run", parents=[resync], help="Pipeline completo (padrão).")
+    p_extract = etapas.add_parser("extract", parents=[resync], help="Crawl do Basecamp -> snapshot da extração.")
+    p_extract.add_argument("--saida", help=f"Parquet de saída (padrão: {SNAPSHOT_EXTRACAO}).")
+    p_transform = etapas.add_parser("transform", help="Snapshot da extração -> snapshot tratado.")
+    p_transform.add_argument("--entrada", help=f"Parquet de entrada (padrão: {SNAPSHOT_EXTRACAO}).")
+    p_transform.add_argument("--saida", help=f"Parquet de saída (padrão: {SNAPSHOT_TRATADO}).")
+    p_publish = etapas.add_parser("publish", parents=[resync], help="Snapshot tratado -> abas do Google Sheets.")
+    p_publish.add_argument("--entrada", help=f"Parquet de entrada (padrão: {SNAPSHOT_TRATADO}).")
+    for p in (p_transform, p_publish):
+        p.add_argument("--alvo", help="Nome do alvo em ALVOS_SINCRONIA (obrigatório se houver mais de um).")
+    return parser
 
 if __name__ == "__main__":
-    asyncio.run(main_process())
+    args = criar_parser().parse_args()
+    try:
+        if args.etapa == "extract": asyncio.run(comando_extract(args))
+        elif args.etapa == "transform": comando_transform(args)
+        elif args.etapa == "publish": comando_publish(args)
+        else: asyncio.run(main_process(full_resync=args.full_resync))
+    finally:
+        metricas.salvar()
@@ -0,0 +1,405 @@
+"""Benchmark do crawl do Basecamp contra um servidor falso local.
+
+Sobe um Basecamp falso (http.server) com latência artificial, roda o crawl
+do pipeline (extrair_alvos com o alvo padrão) em modo serial (concorrência
+1) e em modo concorrente, confere que as tarefas coletadas são idênticas e
+imprime o ganho de tempo. Depois repete o crawl com o cache condicional
+aquecido, com o estado incremental (SQLite) e com o motor de recordings em
+lote, conferindo que este devolve as mesmas tarefas que o motor por listas,
+e compara o número de requisições.
+Depois roda dois alvos com projetos em comum num crawl compartilhado e
+confere que cada um recebe o mesmo que receberia num crawl só dele.
+
+Também confere que o limitador de taxa segura a janela mesmo com
+requisições lentas ocupando as vagas de concorrência. Por fim, serve as
+respostas de um bucket em fixture e confere que os dois motores extraem as
+mesmas tarefas delas (a ordem não é comparada). A fixture do repositório,
+fixtures/basecamp_bucket_sintetico.json, foi escrita à mão a partir da
+documentação da API, com as mesmas suposições do motor de recordings: ele
+ainda não foi conferido com dados reais. Uma captura anonimizada de um
+bucket real (capturar_fixtures.py, em fixtures/basecamp_bucket.json) é usada
+no lugar dela quando existe.
+
+Uso: python benchmark_crawl.py [--buckets 3] [--listas 6] [--grupos 3] [--latencia 0.03] [--fixture ARQUIVO]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import AtualizaPlanilha_Cloud as app
+
+TAREFAS_POR_PAGINA = 15
+PASTA_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_CAPTURADA = os.path.join(PASTA_FIXTURES, "basecamp_bucket.json")  # escrita por capturar_fixtures.py
+FIXTURE_SINTETICA = os.path.join(PASTA_FIXTURES, "basecamp_bucket_sintetico.json")
+ORIGEM_CAPTURA = "capturar_fixtures.py"
+API_GRAVADA = "https://3.basecampapi.com"
+CONTA_GRAVADA = "999999999"  # a conta real é trocada por esta na gravação
+
+
+def chave_fixture(caminho, query):
+    """Caminho sem a conta + query em ordem alfabética (sem page=1): a mesma chave na gravação e no replay."""
+    partes = caminho.strip("/").split("/")
+    if partes and partes[0].isdigit(): partes = partes[1:]
+    pares = sorted((k, v) for k, valores in query.items() for v in valores if (k, v) != ("page", "1"))
+    return "/" + "/".join(partes) + ("?" + "&".join(f"{k}={v}" for k, v in pares) if pares else "")
+
+
+class BasecampFalso:
+    """Gera uma hierarquia projetos > listas > grupos > tarefas determinística.
+
+    Com `hoje`, as listas semanais recebem as segundas-feiras anteriores a essa
+    data (semana atual primeiro), para que as abas do mês e o histórico tenham dados.
+    """
+    def __init__(self, base, buckets, listas, grupos, tarefas, hoje=None):
+        self.base = base
+        self.projects = []
+        self.todolists = {}
+        self.groups = {}
+        self.todos = {}
+        self.registros = {}  # listas e grupos por id, para atualizar o completed_ratio
+        proximo_id = [1000]
+
+        def novo_id():
+            proximo_id[0] += 1
+            return proximo_id[0]
+
+        for b in range(buckets):
+            bucket_id = novo_id(); todoset_id = novo_id()
+            self.projects.append({
+                "id": bucket_id, "name": f"SPRINT TIME {b}",
+                "dock": [{"id": todoset_id, "name": "todoset"}],
+            })
+            listas_bucket = []
+            for l in range(listas):
+                list_id = novo_id()
+                if l == 0: titulo = "BACKLOG"
+                elif hoje is None: titulo = f"ATIVIDADES DA SEMANA {l:02d}/01/2025"
+                else: titulo = f"ATIVIDADES DA SEMANA {(hoje - timedelta(days=hoje.weekday(), weeks=l - 1)):%d/%m/%Y}"
+                listas_bucket.append({
+                    "id": list_id, "title": titulo, "updated_at": "2025-01-10T12:00:00Z", "status": "active",
+                    "app_url": f"{base}/app/lists/{list_id}",
+                    "todos_url": f"{base}/{app.ACCOUNT_ID}/buckets/{bucket_id}/todolists/{list_id}/todos.json",
+                    "parent": {"id": todoset_id, "type": "Todoset"}, "bucket": {"id": bucket_id},
+                })
+                self.todos[list_id] = self._gerar_tarefas(novo_id, tarefas, list_id, bucket_id)
+                self.registros[list_id] = listas_bucket[-1]; self._proporcao(list_id)
+                grupos_lista = []
+                for g in range(grupos):
+                    group_id = novo_id()
+                    grupos_lista.append({
+                        "id": group_id, "title": f"Atividades Pessoa{g} Sobrenome{g}", "updated_at": "2025-01-10T12:00:00Z",
+                        "status": "active", "position": g + 1,
+                        "todos_url": f"{base}/{app.ACCOUNT_ID}/buckets/{bucket_id}/todolists/{group_id}/todos.json",
+                        "parent": {"id": list_id, "type": "Todolist"}, "bucket": {"id": bucket_id},
+                    })
+                    self.todos[group_id] = self._gerar_tarefas(novo_id, tarefas, group_id, bucket_id)
+                    self.registros[group_id] = grupos_lista[-1]; self._proporcao(group_id)
+                self.groups[list_id] = grupos_lista
+            self.todolists[todoset_id] = listas_bucket
+
+    def _gerar_tarefas(self, novo_id, quantidade, parent_id, bucket_id):
+        tarefas = {"": [], "completed=true": [], "status=archived": []}
+        for i in range(quantidade):
+            variante = ["", "completed=true", "status=archived"][i % 3]
+            tarefas[variante].append({
+                "id": novo_id(), "title": f"Tarefa {i}", "status": "archived" if variante == "status=archived" else "active",
+                "completed": variante == "completed=true", "trashed": False,
+                "created_at": "2025-01-06T10:00:00Z", "app_url": "http://app/todo",
+                "completion": {"created_at": "2025-01-08T10:00:00Z"} if variante == "completed=true" else None,
+                "parent": {"id": parent_id}, "bucket": {"id": bucket_id}, "position": i + 1,
+            })
+        return tarefas
+
+    def _proporcao(self, parent_id):
+        abertas, concluidas = len(self.todos[parent_id][""]), len(self.todos[parent_id]["completed=true"])
+        self.registros[parent_id]["completed_ratio"] = f"{concluidas}/{abertas + concluidas}"
+
+    def concluir(self, parent_id):
+        """Conclui o primeiro todo aberto da lista/grupo como o Basecamp: muda o completed_ratio, não o updated_at."""
+        tarefa = self.todos[parent_id][""].pop(0)
+        tarefa.update({"completed": True, "completion": {"created_at": "2025-01-20T10:00:00Z"}})
+        self.todos[parent_id]["completed=true"].append(tarefa)
+        self._proporcao(parent_id)
+        return tarefa["id"]
+
+    def _recordings(self, query):
+        buckets = {int(b) for b in query.get("bucket", [""])[0].split(",") if b}
+        status = query.get("status", ["active"])[0]
+        if query.get("type") == ["Todolist"]:
+            todolists = [l for listas in self.todolists.values() for l in listas]
+            candidatos = todolists + [g for l in todolists for g in self.groups.get(l["id"], [])]
+        elif query.get("type") == ["Todo"]:
+            candidatos = [t for variantes in self.todos.values() for lote in variantes.values() for t in lote]
+        else:
+            candidatos = []
+        return [r for r in candidatos if r["bucket"]["id"] in buckets and r.get("status", "active") == status]
+
+    def responder(self, caminho, query):
+        variante = "completed=true" if query.get("completed") == ["true"] else ("status=archived" if query.get("status") == ["archived"] else "")
+        partes = caminho.strip("/").split("/")
+        if caminho.endswith("/projects/recordings.json"):
+            return self._recordings(query), True
+        if caminho.endswith("/projects.json"):
+            itens = self.projects if variante == "" else []
+        elif "/projects/" in caminho:
+            pid = int(partes[-1].replace(".json", ""))
+            return next((p for p in self.projects if p["id"] == pid), None), False
+        elif caminho.endswith("/todolists.json"):
+            itens = self.todolists.get(int(partes[-2]), []) if variante == "" else []
+        elif caminho.endswith("/groups.json"):
+            itens = self.groups.get(int(partes[-2]), []) if variante == "" else []
+        elif caminho.endswith("/todos.json"):
+            itens = self.todos.get(int(partes[-2]), {}).get(variante, [])
+        else:
+            return None, False
+        return itens, True
+
+
+class BasecampFixture:
+    """Serve as respostas de uma fixture (caminho + query -> corpo e próxima página)."""
+    def __init__(self, base, caminho):
+        with open(caminho, "r", encoding="utf-8") as f:
+            dados = json.loads(f.read().replace(f"{API_GRAVADA}/{CONTA_GRAVADA}", f"{base}/{app.ACCOUNT_ID}"))
+        self.base = base
+        self.bucket_id = dados["bucket_id"]
+        self.capturada = dados.get("origem") == ORIGEM_CAPTURA
+        self.limite_listas = dados["limite_listas"]  # a seleção usada na gravação
+        self.respostas = dados["respostas"]
+
+    def responder(self, caminho, query):
+        resposta = self.respostas.get(chave_fixture(caminho, query))
+        return (resposta["corpo"] if resposta else None), False
+
+    def proximo(self, caminho, query):
+        resposta = self.respostas.get(chave_fixture(caminho, query))
+        return f'<{resposta["link"]}>; rel="next"' if resposta and resposta["link"] else None
+
+
+def subir_servidor(latencia, por_pagina=TAREFAS_POR_PAGINA, taxa_429=0.0, retry_after="0", seed=7):
+    """Servidor falso em thread; `taxa_429` é a fração de requisições respondidas com 429 + Retry-After.
+
+    POST /authorization/token emite um token novo. Com `servidor.tokens` igual
+    a um conjunto, só os tokens dele são aceitos (os demais recebem 401); com
+    None, qualquer token vale.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with self.server.lock:
+                self.server.tokens_emitidos += 1
+                token = f"token-{self.server.tokens_emitidos}"
+                if self.server.tokens is not None: self.server.tokens.add(token)
+            dados = json.dumps({"access_token": token, "expires_in": 1209600}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            time.sleep(latencia)
+            with self.server.lock:
+                self.server.requisicoes += 1
+                limitada = self.server.rng.random() < taxa_429
+                if limitada: self.server.respostas_429 += 1
+            tokens = self.server.tokens
+            if tokens is not None and self.headers.get("Authorization", "").replace("Bearer ", "") not in tokens:
+                self.send_response(401)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if limitada:
+                self.send_response(429)
+                self.send_header("Retry-After", retry_after)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            parsed = urlparse(self.path)
+            query = parse_qs(parsed.query)
+            corpo, paginado = self.server.falso.responder(parsed.path, query)
+            if corpo is None:
+                self.send_response(404); self.end_headers(); return
+            link = None
+            if hasattr(self.server.falso, "proximo"): link = self.server.falso.proximo(parsed.path, query)
+            if paginado:
+                pagina = int(query.get("page", ["1"])[0])
+                inicio = (pagina - 1) * por_pagina
+                if inicio + por_pagina < len(corpo):
+                    conector = "&" if parsed.query else "?"
+                    base = self.path.replace(f"page={pagina}", f"page={pagina + 1}") if "page=" in self.path else f"{self.path}{conector}page={pagina + 1}"
+                    link = f'<{self.server.falso.base}{base}>; rel="next"'
+                corpo = corpo[inicio:inicio + por_pagina]
+            dados = json.dumps(corpo).encode()
+            etag = '"' + hashlib.md5(dados).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.send_header("ETag", etag)
+            if link: self.send_header("Link", link)
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    servidor.falso = None
+    servidor.requisicoes = 0
+    servidor.respostas_429 = 0
+    servidor.tokens = None
+    servidor.tokens_emitidos = 0
+    servidor.rng = random.Random(seed)
+    servidor.lock = threading.Lock()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def medir_alvos(alvos, cache=None, estado=None):
+    """extrair_alvos com o cache HTTP e o estado incremental nesses arquivos (sem eles, a frio num diretório descartado)."""
+    with tempfile.TemporaryDirectory() as pasta:
+        app.CACHE_HTTP_ARQUIVO = cache or f"{pasta}/basecamp_http.json"
+        app.ESTADO_SINCRONIA_ARQUIVO = estado or f"{pasta}/sincronia.sqlite3"
+        inicio = time.perf_counter()
+        dfs = asyncio.run(app.extrair_alvos("token-falso", alvos))
+        return dfs, time.perf_counter() - inicio
+
+
+def medir(max_concorrencia, max_por_host, cache=None, estado=None):
+    """O alvo padrão com essa concorrência: (DataFrame, segundos)."""
+    app.MAX_CONCORRENCIA = app.HTTP_POOL_SIZE = max_concorrencia
+    app.MAX_CONCORRENCIA_POR_HOST = max_por_host
+    dfs, segundos = medir_alvos([app.alvo_padrao()], cache, estado)
+    return dfs.get(""), segundos
+
+
+async def maior_rajada(capacidade=10, janela=1.0, concorrencia=4, lentas=4, total=40):
+    """Maior número de envios numa janela do limitador quando as primeiras requisições demoram e as outras esperam vaga."""
+    controle = app.ControleCrawl(concorrencia, concorrencia, app.LimitadorTaxa(capacidade, janela))
+    envios = []
+    async def requisicao(i):
+        async with controle.limitar("http://basecamp.falso/"):
+            envios.append(time.monotonic())
+            await asyncio.sleep(1.5 * janela if i < lentas else 0.01)
+    await asyncio.gather(*[requisicao(i) for i in range(total)])
+    return max(sum(1 for t in envios if inicio <= t < inicio + janela) for inicio in envios)
+
+
+def contar_requisicoes(servidor, func, *args):
+    servidor.requisicoes = 0
+    resultado = func(*args)
+    return resultado, servidor.requisicoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buckets", type=int, default=3)
+    parser.add_argument("--listas", type=int, default=6)
+    parser.add_argument("--grupos", type=int, default=3)
+    parser.add_argument("--tarefas", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=0.03)
+    parser.add_argument("--concorrencia", type=int, default=app.MAX_CONCORRENCIA)
+    parser.add_argument("--por-host", type=int, default=app.MAX_CONCORRENCIA_POR_HOST)
+    parser.add_argument("--fixture", default=FIXTURE_CAPTURADA if os.path.exists(FIXTURE_CAPTURADA) else FIXTURE_SINTETICA,
+                        help="Respostas de um bucket (padrão: a captura real, se houver, senão a sintética).")
+    args = parser.parse_args()
+
+    servidor = subir_servidor(args.latencia)
+    base = f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.falso = BasecampFalso(base, args.buckets, args.listas, args.grupos, args.tarefas)
+    app.BASECAMP_API_BASE = base
+    app.LIMITE_LISTAS_RECENTES = 0
+    app.BASECAMP_LIMITE_REQUISICOES = 10 ** 6  # o servidor falso não impõe rate limit
+
+    arquivos = tempfile.TemporaryDirectory()
+    serial, t_serial = medir(1, 1)
+    (concorrente, t_conc), req_conc = contar_requisicoes(servidor, medir, args.concorrencia, args.por_host)
+    assinatura = lambda df: df[["id", "hierarquia_semana", "hierarquia_grupo"]].astype(str).values.tolist()
+    identico = assinatura(serial) == assinatura(concorrente)
+
+    cache = f"{arquivos.name}/basecamp_http.json"
+    medir(args.concorrencia, args.por_host, cache)
+    (aquecido, t_cache), req_cache = contar_requisicoes(servidor, medir, args.concorrencia, args.por_host, cache)
+    reaproveitadas = app.metricas.cache_http
+    identico = identico and assinatura(aquecido) == assinatura(concorrente)
+
+    app.MOTOR_CRAWL = "recordings"
+    (recordings, t_rec), req_rec = contar_requisicoes(servidor, medir, args.concorrencia, args.por_host)
+    app.MOTOR_CRAWL = "listas"
+    completa = lambda df: [tuple(linha) for linha in df.astype(str).values.tolist()]
+    mesmo_conjunto = sorted(completa(recordings)) == sorted(completa(concorrente))
+    identico = identico and mesmo_conjunto
+
+    estado = f"{arquivos.name}/sincronia.sqlite3"
+    medir(args.concorrencia, args.por_host, None, estado)
+    (incremental, t_inc), req_inc = contar_requisicoes(servidor, medir, args.concorrencia, args.por_host, None, estado)
+    identico = identico and assinatura(incremental) == assinatura(concorrente)
+    # Conclusão tardia num grupo de semana antiga: o estado incremental não pode congelar a tarefa
+    grupo_antigo = servidor.falso.groups[servidor.falso.todolists[servidor.falso.projects[0]["dock"][0]["id"]][-1]["id"]][0]["id"]
+    concluida = servidor.falso.concluir(grupo_antigo)
+    tardia, _ = medir(args.concorrencia, args.por_host, None, estado)
+    conclusao_vista = bool(((tardia["id"] == concluida) & tardia["completed"]).any())
+    identico = identico and conclusao_vista
+
+    # Dois alvos que dividem o bucket 1: um só com backlogs, outro com as semanas
+    nomes = [p["name"] for p in servidor.falso.projects]
+    alvos = [
+        app.AlvoSincronia("time-a", app.ACCOUNT_ID, nomes[:2], ["BACKLOG"], "Planilha A", None),
+        app.AlvoSincronia("time-b", app.ACCOUNT_ID, nomes[1:], ["ATIVIDADES DA SEMANA", "BACKLOG"], "Planilha B", None),
+    ]
+    (separados, req_separados) = [], 0
+    for alvo in alvos:
+        (dfs, _), req = contar_requisicoes(servidor, medir_alvos, [alvo])
+        separados.append(dfs[alvo.nome]); req_separados += req
+    (compartilhado, t_alvos), req_alvos = contar_requisicoes(servidor, medir_alvos, alvos)
+    mesmos_alvos = all(assinatura(compartilhado[a.nome]) == assinatura(df) for a, df in zip(alvos, separados))
+    identico = identico and mesmos_alvos
+
+    # Fixture: os dois motores contra as mesmas respostas de um bucket
+    servidor.falso = BasecampFixture(base, args.fixture)
+    app.LIMITE_LISTAS_RECENTES = servidor.falso.limite_listas
+    fixture_listas, _ = medir(args.concorrencia, args.por_host)
+    app.MOTOR_CRAWL = "recordings"
+    fixture_rec, _ = medir(args.concorrencia, args.por_host)
+    app.MOTOR_CRAWL = "listas"
+    mesmas_fixture = len(fixture_listas) > 0 and sorted(completa(fixture_rec)) == sorted(completa(fixture_listas))
+    identico = identico and mesmas_fixture
+
+    rajada = asyncio.run(maior_rajada())
+    identico = identico and rajada <= 10
+
+    print("\n=== RESULTADO ===")
+    print(f"Tarefas coletadas: {len(concorrente)} | Saída idêntica ao serial: {identico}")
+    print(f"Serial (1/1):      {t_serial:.2f}s")
+    print(f"Concorrente ({args.concorrencia}/{args.por_host}): {t_conc:.2f}s")
+    print(f"Ganho:             {t_serial / t_conc:.1f}x")
+    print(f"Requisições:       {req_conc} | 304 com cache aquecido: {reaproveitadas}/{req_cache} ({t_cache:.2f}s)")
+    print(f"Estado incremental: {req_inc} requisições ({t_inc:.2f}s) | conclusão tardia em semana antiga vista: {conclusao_vista}")
+    print(f"Motor recordings:  {req_rec} requisições ({t_rec:.2f}s) | mesmas tarefas: {mesmo_conjunto}")
+    print(f"Dois alvos:        {req_alvos} requisições no crawl compartilhado vs {req_separados} em crawls separados "
+          f"({t_alvos:.2f}s) | mesmas tarefas por alvo: {mesmos_alvos}")
+    print(f"Limitador:         no máximo {rajada} envios em 1s (limite 10, 4 requisições lentas na frente)")
+    print(f"Fixture {'capturada' if servidor.falso.capturada else 'SINTÉTICA'}: bucket {servidor.falso.bucket_id} | {len(fixture_listas)} tarefas por listas, "
+          f"{len(fixture_rec)} por recordings | mesmas tarefas: {mesmas_fixture}")
+    if not servidor.falso.capturada: print("   ⚠️ Motor de recordings não conferido com dados reais: rode capturar_fixtures.py num bucket.")
+    servidor.shutdown()
+    arquivos.cleanup()
+    if not identico: raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Micro-benchmark da atribuição de Encarregado.
+
+Compara o `.apply(encontrar_encarregado)` linha a linha com o índice de
+equipe + resolução por valor único (`indexar_equipes` / `atribuir_encarregados`)
+sobre tarefas sintéticas, e confere que o resultado é idêntico.
+
+Uso: python benchmark_encarregado.py [--tarefas 50000] [--equipe 40]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+import AtualizaPlanilha_Cloud as app
+
+NOMES = ["João", "Maria", "José", "Ana", "Luís", "Márcia", "Pedro", "Paula", "Sérgio", "Fátima"]
+SOBRENOMES = ["Silva", "Souza", "Santos", "Sampaio", "Oliveira", "Olímpio", "Pereira", "Pêra", "Lima", "Li"]
+
+
+def gerar_equipe(tamanho, rng):
+    nomes = [f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}" for _ in range(tamanho)]
+    nomes += [rng.choice(NOMES), "", None]  # só primeiro nome, vazio e nulo
+    return pd.DataFrame({"Nome": nomes})
+
+
+def gerar_sub_listas(quantidade, rng):
+    valores = ["(Raiz)", "", None, np.nan, "Atividades", "ATIVIDADES joao", "Atividades Fulano Tal"]
+    for _ in range(200):
+        nome = rng.choice(NOMES); sobrenome = rng.choice(SOBRENOMES + [""])
+        prefixo = rng.choice(["Atividades ", "ATIVIDADES ", ""])
+        valores.append(f"{prefixo}{nome.lower() if rng.random() < 0.3 else nome} {sobrenome}".strip())
+    return pd.Series([rng.choice(valores) for _ in range(quantidade)], dtype=object)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tarefas", type=int, default=50000)
+    parser.add_argument("--equipe", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    df_equipes = gerar_equipe(args.equipe, rng)
+    serie = gerar_sub_listas(args.tarefas, rng)
+
+    inicio = time.perf_counter()
+    linha_a_linha = serie.apply(lambda x: app.encontrar_encarregado(x, df_equipes))
+    t_apply = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indice = app.indexar_equipes(df_equipes)
+    vetorizado = app.atribuir_encarregados(serie, indice)
+    t_indice = time.perf_counter() - inicio
+
+    identico = linha_a_linha.tolist() == vetorizado.tolist()
+    print("\n=== RESULTADO ===")
+    print(f"Tarefas: {len(serie)} | Equipe: {len(df_equipes)} | Resultado idêntico: {identico}")
+    print(f"apply(encontrar_encarregado): {t_apply:.2f}s")
+    print(f"indice + valores únicos:      {t_indice:.4f}s")
+    print(f"Ganho:                        {t_apply / t_indice:.0f}x")
+    if not identico: raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
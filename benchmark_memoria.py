@@ -0,0 +1,167 @@
+"""Benchmark de memória: JSON completo em lista vs projeção em colunas tipadas.
+
+Simula um crawl de N tarefas chegando em páginas de 50 (com os objetos
+aninhados que o Basecamp devolve: creator, bucket, parent, completion...) e
+mede o pico de memória (tracemalloc) de montar o DataFrame tratado:
+
+- antes: todos os dicts em `all_tasks`, pd.DataFrame(all_tasks) + drop_duplicates
+- agora: projetar_pagina por página + AcumuladorTarefas (categorias, dedupe na entrada)
+
+Depois roda o caminho real (extrair_alvos) contra o Basecamp falso do
+benchmark_crawl com tarefas no formato completo: a frio e de novo com o
+cache HTTP (304) e o estado incremental, medindo o pico de cada execução e
+o tamanho do cache gravado. O pico inclui o servidor falso, que roda no
+mesmo processo.
+
+Uso: python benchmark_memoria.py [--tarefas 200000] [--crawl-listas 40] [--crawl-tarefas 60]
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import AtualizaPlanilha_Cloud as app
+from benchmark_crawl import BasecampFalso, subir_servidor
+
+TAREFAS_POR_PAGINA = 50
+PESSOA = {"id": 1, "attachable_sgid": "x" * 60, "name": "Fulano de Tal", "email_address": "fulano@exemplo.com",
+          "personable_type": "User", "title": "Dev", "bio": None, "location": None, "admin": False, "owner": False,
+          "avatar_url": "https://exemplo.com/avatar/" + "a" * 80, "company": {"id": 2, "name": "Empresa"}}
+
+
+def gerar_paginas(total, listas=40, grupos=6):
+    """Páginas de todos sintéticos com o formato do Basecamp; ~2% de ids repetidos entre listas."""
+    pagina = []
+    for i in range(total):
+        tid = i - 1 if i % 50 == 0 and i else i
+        n_pagina = i // TAREFAS_POR_PAGINA  # uma página pertence a uma única lista/grupo
+        lista = n_pagina % listas; grupo = n_pagina % grupos
+        concluida = i % 3 == 0
+        pagina.append({
+            "id": tid, "status": "archived" if i % 7 == 0 else "active", "visible_to_clients": False,
+            "created_at": "2025-01-06T10:00:00.000-03:00", "updated_at": "2025-01-07T10:00:00.000-03:00",
+            "title": f"Tarefa sintética número {i}", "inherits_status": True, "type": "Todo",
+            "url": f"https://3.basecampapi.com/1/buckets/2/todos/{tid}.json",
+            "app_url": f"https://3.basecamp.com/1/buckets/2/todos/{tid}",
+            "bookmark_url": f"https://3.basecampapi.com/1/my/bookmarks/{'b' * 40}.json",
+            "subscription_url": f"https://3.basecampapi.com/1/buckets/2/recordings/{tid}/subscription.json",
+            "comments_count": 0, "comments_url": f"https://3.basecampapi.com/1/buckets/2/recordings/{tid}/comments.json",
+            "position": i, "parent": {"id": lista, "title": f"ATIVIDADES DA SEMANA {lista}", "type": "Todolist",
+                                      "url": "https://3.basecampapi.com/x.json", "app_url": "https://3.basecamp.com/x"},
+            "bucket": {"id": 2, "name": "SPRINT", "type": "Project"}, "creator": dict(PESSOA),
+            "description": "<div>Descrição longa da tarefa</div>" * 3, "completed": concluida, "content": f"Tarefa {i}",
+            "starts_on": None, "due_on": None, "assignees": [dict(PESSOA)], "completion_subscribers": [],
+            "completion_url": f"https://3.basecampapi.com/1/buckets/2/todos/{tid}/completion.json",
+            "completion": {"created_at": "2025-01-08T10:00:00.000-03:00", "creator": dict(PESSOA)} if concluida else None,
+            "trashed": False,
+            "_tags": (f"ATIVIDADES DA SEMANA {lista:02d}/01/2025", f"Atividades Pessoa {grupo}", f"https://3.basecamp.com/l/{lista}"),
+        })
+        if len(pagina) == TAREFAS_POR_PAGINA:
+            yield pagina
+            pagina = []
+    if pagina: yield pagina
+
+
+def caminho_antigo(total):
+    all_tasks = []
+    for pagina in gerar_paginas(total):
+        for t in pagina:
+            t['hierarquia_semana'], t['hierarquia_grupo'], t['parent_list_url'] = t.pop('_tags')
+        all_tasks.extend(pagina)
+    return pd.DataFrame(all_tasks).drop_duplicates(subset='id', keep='first')
+
+
+def caminho_novo(total):
+    acumulador = app.AcumuladorTarefas()
+    for pagina in gerar_paginas(total):
+        semana, grupo, url = pagina[0]['_tags']
+        acumulador.adicionar([app.TarefaResumo(*campos, semana, grupo, url) for campos in app.projetar_pagina(pagina)])
+    return acumulador.para_dataframe()
+
+
+def completar_todos(falso):
+    """Dá às tarefas enxutas do Basecamp falso os campos que a API real também devolve (creator, urls, descrição...)."""
+    for variantes in falso.todos.values():
+        for lote in variantes.values():
+            for t in lote:
+                tid = t["id"]
+                t.update({
+                    "visible_to_clients": False, "updated_at": "2025-01-07T10:00:00.000-03:00", "inherits_status": True,
+                    "type": "Todo", "url": f"https://3.basecampapi.com/1/buckets/2/todos/{tid}.json",
+                    "bookmark_url": f"https://3.basecampapi.com/1/my/bookmarks/{'b' * 40}.json",
+                    "subscription_url": f"https://3.basecampapi.com/1/buckets/2/recordings/{tid}/subscription.json",
+                    "comments_count": 0, "comments_url": f"https://3.basecampapi.com/1/buckets/2/recordings/{tid}/comments.json",
+                    "creator": dict(PESSOA), "description": "<div>Descrição longa da tarefa</div>" * 3, "content": t["title"],
+                    "starts_on": None, "due_on": None, "assignees": [dict(PESSOA)], "completion_subscribers": [],
+                    "completion_url": f"https://3.basecampapi.com/1/buckets/2/todos/{tid}/completion.json",
+                })
+                if t.get("completion"): t["completion"]["creator"] = dict(PESSOA)
+
+
+def medir_crawl(listas, tarefas, grupos=3):
+    """extrair_alvos a frio e depois com cache HTTP + estado incremental: (tarefas, pico 1ª, pico 2ª, MiB do cache, mesmos ids)."""
+    servidor = subir_servidor(0.0, TAREFAS_POR_PAGINA)
+    base = f"http://127.0.0.1:{servidor.server_address[1]}"
+    buckets = max(1, listas // 10)
+    servidor.falso = BasecampFalso(base, buckets, -(-listas // buckets), grupos, tarefas)
+    completar_todos(servidor.falso)
+    app.BASECAMP_API_BASE = base
+    app.LIMITE_LISTAS_RECENTES = 0
+    app.BASECAMP_LIMITE_REQUISICOES = 10 ** 6
+    picos = []; dfs = []
+    with tempfile.TemporaryDirectory() as pasta:
+        app.CACHE_HTTP_ARQUIVO = f"{pasta}/basecamp_http.json"
+        app.ESTADO_SINCRONIA_ARQUIVO = f"{pasta}/sincronia.sqlite3"
+        for _ in range(2):
+            gc.collect()
+            tracemalloc.start()
+            with contextlib.redirect_stdout(io.StringIO()):
+                dfs.append(asyncio.run(app.extrair_alvos("token-falso", [app.alvo_padrao()]))[""])
+            picos.append(tracemalloc.get_traced_memory()[1] / 2 ** 20)
+            tracemalloc.stop()
+        tamanho_cache = os.path.getsize(app.CACHE_HTTP_ARQUIVO) / 2 ** 20
+    servidor.shutdown()
+    return len(dfs[0]), picos[0], picos[1], tamanho_cache, dfs[0]['id'].tolist() == dfs[1]['id'].tolist()
+
+
+def medir(func, total):
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    df = func(total)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, pico / 2 ** 20, df.memory_usage(deep=True).sum() / 2 ** 20, duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tarefas", type=int, default=200000)
+    parser.add_argument("--crawl-listas", type=int, default=40, help="Listas no Basecamp falso (10 por bucket).")
+    parser.add_argument("--crawl-tarefas", type=int, default=60, help="Tarefas por lista/grupo no Basecamp falso.")
+    args = parser.parse_args()
+
+    df_antigo, pico_antigo, final_antigo, t_antigo = medir(caminho_antigo, args.tarefas)
+    df_novo, pico_novo, final_novo, t_novo = medir(caminho_novo, args.tarefas)
+    mesmos_ids = df_antigo['id'].tolist() == df_novo['id'].tolist()
+    n_crawl, pico_frio, pico_quente, tamanho_cache, mesmos_crawl = medir_crawl(args.crawl_listas, args.crawl_tarefas)
+
+    print("\n=== RESULTADO ===")
+    print(f"Tarefas: {args.tarefas} | Únicas: {len(df_novo)} | Mesmos ids e ordem: {mesmos_ids}")
+    print(f"Antes: pico {pico_antigo:8.1f} MiB | DataFrame {final_antigo:7.1f} MiB | {df_antigo.shape[1]} colunas | {t_antigo:.1f}s")
+    print(f"Agora: pico {pico_novo:8.1f} MiB | DataFrame {final_novo:7.1f} MiB | {df_novo.shape[1]} colunas | {t_novo:.1f}s")
+    print(f"Crawl (extrair_alvos, {n_crawl} tarefas): 1ª pico {pico_frio:.1f} MiB | 2ª (304 + estado) pico {pico_quente:.1f} MiB | "
+          f"cache HTTP {tamanho_cache:.1f} MiB | mesmos ids: {mesmos_crawl}")
+    if not (mesmos_ids and mesmos_crawl): raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
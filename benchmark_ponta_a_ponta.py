@@ -0,0 +1,233 @@
+"""Benchmark ponta a ponta do main_process, sem credenciais.
+
+Sobe o Basecamp falso do benchmark_crawl (latência, tamanho de página e
+injeção de 429 configuráveis) e troca o cliente gspread por uma planilha em
+memória que aplica os batch_update/values_batch_update e conta as chamadas.
+Para cada escala (número total de listas) roda o main_process duas vezes
+com caches locais num diretório temporário: a primeira execução parte do
+zero, a segunda reaproveita token, cache HTTP, estado incremental e a
+planilha já escrita (com --revogar-token, o token guardado é recusado com
+401 e o script precisa renová-lo no meio do crawl). Imprime tempo,
+tarefas/s, requisições HTTP, respostas 429, tokens emitidos, chamadas ao
+Sheets e pico de memória (tracemalloc; inclui o servidor falso, que roda no
+mesmo processo).
+
+Uso: python benchmark_ponta_a_ponta.py [--escalas 5,50,500] [--latencia 0.01] [--por-pagina 15] [--taxa-429 0.02]
+"""
+import argparse
+import asyncio
+import gc
+import math
+import re
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+import AtualizaPlanilha_Cloud as app
+from benchmark_crawl import BasecampFalso, subir_servidor
+
+LISTAS_POR_BUCKET = 10
+
+
+# --- SHEETS FALSO ---
+class AbaFalsa:
+    """O que o script usa de gspread.Worksheet: id, title, row_count, col_count."""
+    def __init__(self, sheet_id, title, rows, cols):
+        self.id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.grade = []
+
+    def escrever(self, linha, coluna, valores):
+        for i, valores_linha in enumerate(valores):
+            while len(self.grade) <= linha + i: self.grade.append([])
+            atual = self.grade[linha + i]
+            if len(atual) < coluna + len(valores_linha): atual.extend([""] * (coluna + len(valores_linha) - len(atual)))
+            atual[coluna:coluna + len(valores_linha)] = [str(v) for v in valores_linha]
+
+    def valores(self):
+        # a API omite linhas e células vazias no fim
+        linhas = [list(l) for l in self.grade]
+        for l in linhas:
+            while l and l[-1] == "": l.pop()
+        while linhas and not linhas[-1]: linhas.pop()
+        return linhas
+
+
+class PlanilhaFalsa:
+    """gspread.Spreadsheet em memória: aplica as requisições que o script envia e conta as chamadas."""
+    def __init__(self):
+        self.abas = []
+        self.chamadas = Counter()
+        self.versao = 0  # faz as vezes do modifiedTime do Drive
+        self._properties = {}
+
+    def _aba(self, nome=None, sheet_id=None):
+        return next(a for a in self.abas if a.title == nome or a.id == sheet_id)
+
+    def worksheets(self):
+        self.chamadas["worksheets"] += 1
+        return list(self.abas)
+
+    def add_worksheet(self, title, rows, cols):
+        self.chamadas["add_worksheet"] += 1
+        aba = AbaFalsa(len(self.abas) + 1, title, rows, cols)
+        self.abas.append(aba)
+        return aba
+
+    def get_lastUpdateTime(self):
+        self.chamadas["get_lastUpdateTime"] += 1
+        return f"versao-{self.versao}"
+
+    def values_batch_get(self, ranges):
+        self.chamadas["values_batch_get"] += 1
+        faixas = []
+        for r in ranges:
+            nome, _, colunas = r.partition("!")
+            valores = self._aba(nome=nome_da_faixa(nome)).valores()
+            if colunas:  # só "X:X" (uma coluna inteira)
+                indice = celula_inicial(colunas.split(":")[0] + "1")[1]
+                valores = [[l[indice]] if indice < len(l) and l[indice] != "" else [] for l in valores]
+                while valores and not valores[-1]: valores.pop()
+            faixas.append({"range": r, "values": valores})
+        return {"valueRanges": faixas}
+
+    def values_batch_update(self, body):
+        self.chamadas["values_batch_update"] += 1
+        self.versao += 1
+        for item in body["data"]:
+            nome, celula = item["range"].rsplit("!", 1)
+            linha, coluna = celula_inicial(celula)
+            self._aba(nome=nome_da_faixa(nome)).escrever(linha, coluna, item["values"])
+
+    def batch_update(self, body):
+        self.chamadas["batch_update"] += 1
+        self.versao += 1
+        for pedido in body["requests"]:
+            tipo, dados = next(iter(pedido.items()))
+            self.chamadas[f"  {tipo}"] += 1
+            if tipo == "deleteDimension":
+                aba = self._aba(sheet_id=dados["range"]["sheetId"])
+                del aba.grade[dados["range"]["startIndex"]:dados["range"]["endIndex"]]
+                aba.row_count -= dados["range"]["endIndex"] - dados["range"]["startIndex"]
+            elif tipo == "appendDimension":
+                aba = self._aba(sheet_id=dados["sheetId"])
+                if dados["dimension"] == "ROWS": aba.row_count += dados["length"]
+                else: aba.col_count += dados["length"]
+            elif tipo == "updateCells":
+                aba = self._aba(sheet_id=dados["range"]["sheetId"])
+                linha0 = dados["range"].get("startRowIndex", 0); coluna0 = dados["range"].get("startColumnIndex", 0)
+                aba.grade = [l if i < linha0 else l[:coluna0] for i, l in enumerate(aba.grade)]
+
+
+class ClienteFalso:
+    def __init__(self, planilha):
+        self.planilha = planilha
+
+    def open(self, title=None, folder_id=None):
+        # como o gspread, a busca por título já traz o modifiedTime
+        self.planilha._properties = {"modifiedTime": f"versao-{self.planilha.versao}"}
+        return self.planilha
+
+
+def nome_da_faixa(faixa):
+    return faixa[1:-1].replace("''", "'") if faixa.startswith("'") else faixa
+
+
+def celula_inicial(faixa):
+    letras, numero = re.match(r"([A-Z]+)(\d+)", faixa).groups()
+    coluna = 0
+    for letra in letras: coluna = coluna * 26 + ord(letra) - ord("A") + 1
+    return int(numero) - 1, coluna - 1
+
+
+def nova_planilha(grupos):
+    planilha = PlanilhaFalsa()
+    equipes = planilha.add_worksheet(app.NOME_ABA_EQUIPES, 100, 5)
+    equipes.grade = [["Nome"]] + [[f"Pessoa{g} Sobrenome{g}"] for g in range(grupos)]
+    planilha.chamadas.clear()
+    return planilha
+
+
+# --- EXECUÇÃO ---
+def configurar_app(base, pasta):
+    app.BASECAMP_API_BASE = base
+    app.LIMITE_LISTAS_RECENTES = 0
+    app.BASECAMP_LIMITE_REQUISICOES = 10 ** 6  # o servidor falso só limita via 429 injetado
+    app.BACKOFF_BASE = 0.01
+    app.CACHE_HTTP_ARQUIVO = f"{pasta}/basecamp_http.json"
+    app.ESTADO_SINCRONIA_ARQUIVO = f"{pasta}/sincronia.sqlite3"
+    app.CONSOLIDACAO_ARQUIVO = f"{pasta}/consolidacao.json"
+    app.SNAPSHOT_EXTRACAO = f"{pasta}/extracao.parquet"
+    app.SNAPSHOT_TRATADO = f"{pasta}/tratado.parquet"
+    app.TOKEN_CACHE_ARQUIVO = f"{pasta}/token/basecamp_token.json"  # como numa máquina local; no Actions fica vazio (só memória)
+    app.EQUIPES_CACHE_ARQUIVO = f"{pasta}/equipes.json"
+    app.BASECAMP_TOKEN_URL = f"{base}/authorization/token"
+    app.REFRESH_TOKEN_SECRETO = "refresh-falso"
+
+
+def executar(servidor, planilha):
+    app.conectar_google_sheets = lambda: ClienteFalso(planilha)
+    app.metricas = app.Metricas()
+    servidor.requisicoes = 0; servidor.respostas_429 = 0; servidor.tokens_emitidos = 0
+    planilha.chamadas.clear()
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    asyncio.run(app.main_process())
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "tempo": duracao, "pico": pico / 2 ** 20, "http": servidor.requisicoes, "429": servidor.respostas_429,
+        "sheets": sum(n for k, n in planilha.chamadas.items() if not k.startswith(" ")), "tokens": servidor.tokens_emitidos,
+        "chamadas": dict(planilha.chamadas), "erros": len(app.metricas.erros), "falhas": len(app.metricas.urls_com_falha),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", default="5,50,500", help="Total de listas por cenário, separado por vírgula.")
+    parser.add_argument("--grupos", type=int, default=2)
+    parser.add_argument("--tarefas", type=int, default=12, help="Tarefas por lista/grupo (divididas entre ativas, concluídas e arquivadas).")
+    parser.add_argument("--latencia", type=float, default=0.01)
+    parser.add_argument("--por-pagina", type=int, default=15)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", default="0")
+    parser.add_argument("--revogar-token", action="store_true", help="Recusa o token guardado na 2ª execução (401 no meio do crawl).")
+    parser.add_argument("--detalhar", action="store_true", help="Imprime as chamadas ao Sheets por tipo.")
+    args = parser.parse_args()
+
+    servidor = subir_servidor(args.latencia, args.por_pagina, args.taxa_429, args.retry_after)
+    servidor.tokens = set()
+    base = f"http://127.0.0.1:{servidor.server_address[1]}"
+    resultados = []
+    for listas in [int(e) for e in args.escalas.split(",")]:
+        buckets = math.ceil(listas / LISTAS_POR_BUCKET)
+        servidor.falso = BasecampFalso(base, buckets, math.ceil(listas / buckets), args.grupos, args.tarefas, hoje=datetime.now())
+        planilha = nova_planilha(args.grupos)
+        with tempfile.TemporaryDirectory() as pasta:
+            configurar_app(base, pasta)
+            frio = executar(servidor, planilha)
+            tarefas = len(app.carregar_snapshot(app.SNAPSHOT_EXTRACAO))
+            if args.revogar_token: servidor.tokens.clear()
+            quente = executar(servidor, planilha)
+        resultados.append((listas, tarefas, frio, quente))
+
+    print("\n=== RESULTADO ===")
+    print(f"Latência {args.latencia * 1000:.0f} ms | página {args.por_pagina} | 429 injetado {args.taxa_429:.0%} | concorrência {app.MAX_CONCORRENCIA}/{app.MAX_CONCORRENCIA_POR_HOST}")
+    print(f"{'listas':>6} {'tarefas':>7} | {'execução':<8} {'tempo':>7} {'tarefas/s':>9} {'HTTP':>6} {'429':>4} {'Sheets':>6} {'tokens':>6} {'pico MiB':>8} {'erros':>5}")
+    for listas, tarefas, frio, quente in resultados:
+        for rotulo, r in (("1ª", frio), ("2ª", quente)):
+            print(f"{listas:>6} {tarefas:>7} | {rotulo:<8} {r['tempo']:>6.2f}s {tarefas / r['tempo']:>9.0f} {r['http']:>6} {r['429']:>4} "
+                  f"{r['sheets']:>6} {r['tokens']:>6} {r['pico']:>8.1f} {r['erros'] + r['falhas']:>5}")
+            if args.detalhar: print(f"{'':>17}{r['chamadas']}")
+    servidor.shutdown()
+    if any(r["erros"] or r["falhas"] for _, _, frio, quente in resultados for r in (frio, quente)): raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Grava as respostas do Basecamp de um bucket, anonimizadas, como fixture do benchmark_crawl.
+
+Baixa tudo o que os dois motores consultam num bucket: o projeto, as listas,
+os grupos e os todos (abertos, fechados e arquivados) de cada lista
+selecionada e os streams de /projects/recordings.json (Todolist e Todo,
+ativos e arquivados), seguindo o Link de cada página. Ids, status, datas,
+posições, a cadeia `parent` e a ordem das respostas ficam como vieram; nomes,
+e-mails, avatares, descrições e títulos de tarefas e grupos viram valores
+neutros e a conta vira 999999999.
+
+Uso: python capturar_fixtures.py <bucket_id> [--saida fixtures/basecamp_bucket.json]
+(com as mesmas variáveis de ambiente do script principal para o refresh do token)
+"""
+import argparse
+import asyncio
+import json
+import os
+from urllib.parse import urlparse, parse_qs
+
+import AtualizaPlanilha_Cloud as app
+from benchmark_crawl import API_GRAVADA, CONTA_GRAVADA, FIXTURE_CAPTURADA, ORIGEM_CAPTURA, chave_fixture
+
+LIMITE_LISTAS = 3
+CAMPOS_LIVRES = {"description", "content", "bio", "location", "attachable_sgid", "avatar_url", "app_todos_url"}
+
+
+async def gravar(session, controle, url, respostas):
+    """Todas as páginas de url em `respostas` (corpo + URL da próxima página); devolve os itens concatenados."""
+    itens = []
+    headers = {"Authorization": f"Bearer {controle.credencial.access_token}"}
+    while url:
+        status, corpo, headers_resp = await app.requisitar_json(session, url, headers, controle)
+        partes = urlparse(url)
+        chave = chave_fixture(partes.path, parse_qs(partes.query))
+        if status != 200:
+            print(f"   ⚠️ {chave}: HTTP {status}"); break
+        link = headers_resp.get("Link")
+        respostas[chave] = {"corpo": corpo, "link": app.proximo_link(link)}
+        itens.extend(corpo if isinstance(corpo, list) else [corpo])
+        url = app.proximo_link(link)
+    return itens
+
+
+async def capturar(bucket_id):
+    credencial = app.CredencialBasecamp()
+    if not credencial.obter(): raise SystemExit("Sem token do Basecamp.")
+    controle = app.ControleCrawl(credencial=credencial)
+    api = f"{app.BASECAMP_API_BASE}/{app.ACCOUNT_ID}"
+    respostas = {}
+    async with app.criar_sessao_http() as session:
+        projetos = await gravar(session, controle, f"{api}/projects.json", {})
+        respostas["/projects.json"] = {"corpo": [p for p in projetos if p.get("id") == bucket_id], "link": None}
+        projeto, = await gravar(session, controle, f"{api}/projects/{bucket_id}.json", respostas)
+        todoset_id = next(t["id"] for t in projeto.get("dock", []) if t["name"] == "todoset")
+        url_listas = f"{api}/buckets/{bucket_id}/todosets/{todoset_id}/todolists.json"
+        listas = [l for sufixo in ["", "?status=archived"] for l in await gravar(session, controle, url_listas + sufixo, respostas)]
+        for lista in app.selecionar_listas(listas):
+            url_grupos = f"{api}/buckets/{bucket_id}/todolists/{lista['id']}/groups.json"
+            grupos = [g for sufixo in ["", "?status=archived"] for g in await gravar(session, controle, url_grupos + sufixo, respostas)]
+            for alvo in [lista] + grupos:
+                for sufixo in app.SUFIXOS_TODOS:
+                    await gravar(session, controle, alvo["todos_url"] + sufixo, respostas)
+        base = f"{api}/projects/recordings.json?bucket={bucket_id}"
+        for tipo in ["Todolist", "Todo"]:
+            for status in ["active", "archived"]:
+                await gravar(session, controle, f"{base}&type={tipo}&status={status}", respostas)
+    return respostas
+
+
+def anonimizar(respostas, bucket_id):
+    """Troca dados pessoais e textos livres por valores neutros, estáveis por id, e a conta pela CONTA_GRAVADA."""
+    pessoas = {}; titulos = {}
+
+    def pessoa(p):
+        n = pessoas.setdefault(p.get("id"), len(pessoas) + 1)
+        return {"id": p.get("id"), "name": f"Pessoa {n}", "email_address": f"pessoa{n}@exemplo.com",
+                "personable_type": p.get("personable_type"), "title": "", "bio": None, "location": None,
+                "admin": False, "owner": False, "avatar_url": "", "company": {"id": 1, "name": "Empresa"}}
+
+    def titulo(obj):
+        # Listas e projeto mantêm o título (a seleção depende dele); grupos e todos ganham um neutro
+        tipo = obj.get("type") or ""
+        if tipo == "Todo": return f"Tarefa {obj['id']}"
+        if tipo.startswith("Todolist") and (obj.get("parent") or {}).get("type") == "Todolist":
+            return f"Atividades Pessoa {sum(t.startswith('Atividades') for t in titulos.values()) + 1}"
+        return None
+
+    def coletar_titulos(obj):
+        if isinstance(obj, dict):
+            if "id" in obj and obj["id"] not in titulos and titulo(obj): titulos[obj["id"]] = titulo(obj)
+            for v in obj.values(): coletar_titulos(v)
+        elif isinstance(obj, list):
+            for v in obj: coletar_titulos(v)
+
+    def limpar(obj):
+        if isinstance(obj, dict):
+            if "email_address" in obj: return pessoa(obj)
+            novo = {k: ("" if k in CAMPOS_LIVRES and isinstance(v, str) else limpar(v)) for k, v in obj.items()}
+            if novo.get("id") in titulos:
+                for campo in ("title", "name"):
+                    if campo in novo: novo[campo] = titulos[novo["id"]]
+            if novo.get("id") == bucket_id and "name" in novo: novo["name"] = "SPRINT FIXTURE"
+            return novo
+        if isinstance(obj, list): return [limpar(v) for v in obj]
+        if isinstance(obj, str):
+            return obj.replace(f"{app.BASECAMP_API_BASE}/{app.ACCOUNT_ID}", f"{API_GRAVADA}/{CONTA_GRAVADA}").replace(f"/{app.ACCOUNT_ID}/", f"/{CONTA_GRAVADA}/")
+        return obj
+
+    coletar_titulos(respostas)
+    return {chave: limpar(resposta) for chave, resposta in respostas.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("bucket_id", type=int)
+    parser.add_argument("--saida", default=FIXTURE_CAPTURADA)
+    args = parser.parse_args()
+
+    app.LIMITE_LISTAS_RECENTES = LIMITE_LISTAS  # backlogs + as semanas mais recentes bastam
+    respostas = anonimizar(asyncio.run(capturar(args.bucket_id)), args.bucket_id)
+    pasta = os.path.dirname(args.saida)
+    if pasta: os.makedirs(pasta, exist_ok=True)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump({"origem": ORIGEM_CAPTURA, "bucket_id": args.bucket_id, "limite_listas": LIMITE_LISTAS, "respostas": respostas}, f, ensure_ascii=False, indent=1)
+    print(f"✅ {len(respostas)} respostas gravadas em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()